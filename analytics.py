@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Analytics - pre-aggregated revenue and occupancy rollups
+Features: Incremental updates per session, Day/Hour/Table/Game/User buckets, Bulk rebuild
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+class RevenueRollups:
+    """Per-day buckets of [revenue, sessions, minutes], updated as sessions end or are cleared"""
+
+    DIMENSIONS = ['day', 'hour', 'table', 'game', 'user']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.days = {}
+
+    def record(self, session):
+        """Add a completed session to every rollup it belongs to"""
+        self.apply(session, 1)
+
+    def remove(self, session):
+        """Take a cleared session back out of the rollups"""
+        self.apply(session, -1)
+
+    def rebuild(self, sessions):
+        """Recompute every rollup from scratch in one pass over history"""
+        with self.lock:
+            self.days = {}
+        for session in sessions:
+            self.apply(session, 1)
+
+    def apply(self, session, sign):
+        revenue, minutes = sign * session['amount'], sign * session['duration']
+        with self.lock:
+            day = self.days.setdefault(session['date'], {
+                'day': {}, 'hour': {}, 'table': {}, 'game': {}, 'user': {}, 'occupancy': {}
+            })
+            end_hour = int(session['end_time'][:2])
+            for dimension, key in [
+                ('day', session['date']), ('hour', end_hour), ('table', (session['game_type'], session['table_id'])),
+                ('game', session['game_type']), ('user', session['user'])
+            ]:
+                bucket = day[dimension].setdefault(key, [0.0, 0, 0.0])
+                bucket[0] += revenue
+                bucket[1] += sign
+                bucket[2] += minutes
+
+            # Occupied minutes are spread over the clock hours the session covered
+            for hour, hour_minutes in self.split_by_hour(session):
+                day['occupancy'][hour] = day['occupancy'].get(hour, 0.0) + sign * hour_minutes
+
+    def split_by_hour(self, session):
+        """(hour, minutes) pieces of a session on its end date; time before midnight is not counted"""
+        end = datetime.strptime(session['end_time'], "%H:%M:%S")
+        start = max(end - timedelta(minutes=session['duration']), end.replace(hour=0, minute=0, second=0))
+        pieces = []
+        while start < end:
+            boundary = min(end, start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+            pieces.append((start.hour, (boundary - start).total_seconds() / 60))
+            start = boundary
+        return pieces
+
+    def dates_in(self, date_from, date_to):
+        return sorted(date for date in self.days if date_from <= date <= date_to)
+
+    def revenue(self, by, date_from, date_to):
+        """Revenue, session count and minutes per bucket of one dimension over a date range"""
+        totals = {}
+        with self.lock:
+            for date in self.dates_in(date_from, date_to):
+                for key, (revenue, sessions, minutes) in self.days[date][by].items():
+                    bucket = totals.setdefault(key, [0.0, 0, 0.0])
+                    bucket[0] += revenue
+                    bucket[1] += sessions
+                    bucket[2] += minutes
+
+        rows = []
+        for key, (revenue, sessions, minutes) in sorted(totals.items()):
+            row = {"revenue": round(revenue, 2), "sessions": sessions, "minutes": round(minutes, 1)}
+            if by == 'table':
+                row.update({"game_type": key[0], "table_id": key[1]})
+            else:
+                row[by] = key
+            rows.append(row)
+        return rows
+
+    def utilization(self, date_from, date_to, table_count, open_hours=24):
+        """Occupied share of table time, per table and per clock hour, over a date range.
+        Every calendar day of the range counts, with or without sessions; raises ValueError for bad dates."""
+        days = (datetime.strptime(date_to, "%Y-%m-%d") - datetime.strptime(date_from, "%Y-%m-%d")).days + 1
+        per_table, per_hour = {}, {}
+        with self.lock:
+            for date in self.dates_in(date_from, date_to):
+                for key, (_, _, minutes) in self.days[date]['table'].items():
+                    per_table[key] = per_table.get(key, 0.0) + minutes
+                for hour, minutes in self.days[date]['occupancy'].items():
+                    per_hour[hour] = per_hour.get(hour, 0.0) + minutes
+
+        table_window = max(days, 1) * open_hours * 60
+        hour_window = max(days, 1) * 60 * max(table_count, 1)
+        return {
+            "days": max(days, 0),
+            "tables": [
+                {"game_type": game_type, "table_id": table_id, "minutes": round(minutes, 1),
+                 "utilization": round(100 * minutes / table_window, 1)}
+                for (game_type, table_id), minutes in sorted(per_table.items())
+            ],
+            "hours": [
+                {"hour": hour, "minutes": round(minutes, 1), "utilization": round(100 * minutes / hour_window, 1)}
+                for hour, minutes in sorted(per_hour.items())
+            ]
+        }
@@ -4,15 +4,43 @@ Professional Table Tracker System - Optimized for Render
 Features: Login System, User Management, Snooker & Pool Tracking, Split Bills
 """
 
+import atexit
+import collections
+import csv
+import io
 import json
+import queue
 import threading
 import time
 import os
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, session, stream_with_context, g
 from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import run_simple
+from datetime import datetime, timedelta
+from analytics import RevenueRollups
+from auth import LoginGuard
+from history import SessionHistory
+from http_cache import Compressor, PageCache, etag_matches
+from metrics import Metrics
+from registry import TableRegistry
+from reservations import FIELDS as RESERVATION_FIELDS, ReservationBook, format_time, parse_time, public
+from scheduler import Scheduler
+from snapshots import SnapshotCache
+from tariffs import TariffSchedule, reprice
+from venues import VenueDispatcher
+from waitlist import Waitlist
+from state_store import HostLock, open_state_backend
+
+# Columns of the session history export, in order
+EXPORT_FIELDS = ['id', 'date', 'game_type', 'table_id', 'start_time', 'end_time', 'duration', 'amount', 'user']
+
+# Hashes of the default passwords, precomputed so a fresh worker never hashes at boot
+DEFAULT_USERS = {
+    'admin': ('pbkdf2:sha256:600000$yCt61JTnECJ2yqv9$642ec6db7d31c51a3ff88b1dd979d26f09dca8cfb487820bc1256b84c2a2f0ec', 'admin'),
+    'staff1': ('pbkdf2:sha256:600000$nghM5851RuLNokH4$daa051225b8a7f591de3091a9c8db971e564f3a186fdc9edbb471ebec484427e', 'staff')
+}
 
 class User(UserMixin):
     """User model for authentication system"""
@@ -25,44 +53,458 @@ class User(UserMixin):
 class TableTracker:
     """Main Table Tracker Application"""
     
-    def __init__(self):
+    def __init__(self, start_timers=True, venue=None, config=None):
+        started = time.perf_counter()
+        self.startup_timings = {}
         self.app = Flask(__name__)
         self.app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'fallback-secret-key-change-in-production')
+        if venue:
+            # A login cookie from one venue must not be accepted by another
+            self.app.config['SECRET_KEY'] += f':venue:{venue}'
         CORS(self.app)
+        # Behind Render's proxy every request comes from the proxy; trust PROXY_HOPS X-Forwarded-For
+        # entries (0 when serving clients directly) so login throttling sees the real client address
+        proxy_hops = int(os.environ.get('PROXY_HOPS', 1))
+        if proxy_hops:
+            self.app.wsgi_app = ProxyFix(self.app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+        self.startup_timings['flask_app'] = time.perf_counter() - started
         
         # Initialize data
-        self.init_data()
-        self.setup_authentication()
-        self.setup_routes()
         self.running = True
+        self.venue = venue
+        self.ready = threading.Event()
+        self.restore_error = None
+        self.timed('init_data', self.init_data, config)
+        self.timed('authentication', self.setup_authentication)
+        self.timed('routes', self.setup_routes)
+        
+        # Timer settings; drift samples record how late each wakeup was
+        self.metrics = Metrics()
+        self.timer_interval = float(os.environ.get('TIMER_INTERVAL', 60))
+        self.timer_drift = collections.deque(maxlen=1000)
+        
+        # Routes are live from here; the snapshot restore, template warmup and timer start
+        # happen in the background and requests that need table state wait for them
+        self.startup_timings['serving'] = time.perf_counter() - started
+        if os.environ.get('LAZY_START', '1') == '1':
+            startup_thread = threading.Thread(target=self.finish_startup, args=(start_timers, started), daemon=True)
+            startup_thread.start()
+        else:
+            self.finish_startup(start_timers, started)
+    
+    def timed(self, phase, function, *args):
+        """Run one startup phase and record how long it took"""
+        phase_started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - phase_started
+    
+    def finish_startup(self, start_timers, started):
+        """Second startup phase: restore tables, precompile templates, then start the timer thread"""
+        try:
+            self.timed('restore_state', self.restore_state)
+            self.timed('templates', self.precompile_templates)
+        except Exception as e:
+            self.restore_error = e
+            raise
+        finally:
+            self.startup_timings['ready'] = time.perf_counter() - started
+            self.ready.set()
         
-        # Start timer thread
-        timer_thread = threading.Thread(target=self.update_timers, daemon=True)
-        timer_thread.start()
+        # Per-table alerts and auto-actions run off the timer wheel in every mode
+        self.scheduler.start()
+        for game_type in self.registry.game_types:
+            self.schedule_tables(game_type, list(self.registry.tables(game_type)))
+        self.schedule_closing()
+        
+        if start_timers:
+            timer_thread = threading.Thread(target=self.update_timers, daemon=True)
+            timer_thread.start()
+    
+    def precompile_templates(self):
+        """Compile every template now so the first page view does not pay for it"""
+        for name in self.app.jinja_env.list_templates():
+            self.app.jinja_env.get_template(name)
     
-    def init_data(self):
+    def init_data(self, config=None):
         """Initialize table and user data"""
-        self.snooker_tables = {
-            1: self.create_table(3.0), 2: self.create_table(4.0), 3: self.create_table(4.5)
-        }
-        self.pool_tables = {
-            1: self.create_table(2.0), 2: self.create_table(2.0), 3: self.create_table(2.5)
-        }
-        self.available_rates = [2.0, 3.0, 3.5, 4.0, 4.5, 5.0, 5.5, 6.0, 6.5]
+        if config is None:
+            config_path = os.environ.get('TABLES_CONFIG', os.path.join(os.path.dirname(__file__), 'tables.json'))
+            self.registry = TableRegistry.load(config_path)
+        else:
+            self.registry = TableRegistry(config)
+        self.available_rates = self.registry.available_rates
+        
+        # Completed sessions live outside the live table state; rollups are derived from them
+        self.history = SessionHistory()
+        self.rollups = RevenueRollups()
+        
+        # Phone bookings per table; starting a table warns about one due within RESERVATION_NOTICE minutes
+        self.reservations = ReservationBook()
+        self.reservation_notice = float(os.environ.get('RESERVATION_NOTICE', 60)) * 60
+        
+        # Walk-in parties per game type; ending a session proposes the next one
+        self.waitlist = Waitlist()
+        self.waitlist_lock = threading.Lock()
+        
+        # Time-based table events: prepaid-time alerts and limits, auto-pause after AUTO_PAUSE_MINUTES
+        # without activity (0 = off) and closing every table at CLOSING_TIME ('HH:MM', unset = off)
+        self.scheduler = Scheduler()
+        self.table_timers = {}
+        self.table_timers_lock = threading.Lock()
+        self.alert_minutes = float(os.environ.get('ALERT_MINUTES', 10))
+        self.auto_pause = float(os.environ.get('AUTO_PAUSE_MINUTES', 0)) * 60
+        self.closing_time = os.environ.get('CLOSING_TIME')
+        self.alerts = {game_type: collections.deque(maxlen=100) for game_type in self.registry.game_types}
+        
+        # Encoded get_tables bodies, shared by every poller of the same version and second
+        self.snapshots = SnapshotCache(self.app.json.dumps)
+        
+        # Response compression above COMPRESS_MIN_SIZE bytes, and rendered pages reused until restart
+        self.compressor = Compressor(min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))
+        self.pages = PageCache()
+        
+        # Live update subscribers per game type
+        self.subscribers = {game_type: set() for game_type in self.registry.game_types}
+        self.subscribers_lock = threading.Lock()
+        
+        # State backend: table event log and users ('file' = single process, 'sqlite' = shared by workers)
+        self.data_dir = os.environ.get('DATA_DIR', 'data')
+        if self.venue:
+            self.data_dir = os.path.join(self.data_dir, self.venue)
+        self.ledger, self.users = open_state_backend(self.data_dir, os.environ.get('STATE_BACKEND', 'file'), User)
+        self.scheduler_lock = HostLock(os.path.join(self.data_dir, 'scheduler.lock'))
+        self.sync_lock = threading.RLock()
+        self.synced_seq = 0
+        # Seqs of transitions dropped because their table changed after they were decided
+        self.rejected_events = set()
+        
+        # Default users; password checks run on a small pool with failed-login throttling
+        self.users.seed(DEFAULT_USERS)
+        self.login_guard = LoginGuard(workers=int(os.environ.get('LOGIN_WORKERS', 2)))
+    
+    def table_lock(self, game_type, table_id):
+        """Writer lock for one table; readers use the published (immutable) tables lock-free"""
+        return self.registry.lock(game_type, table_id)
+    
+    def restore_state(self):
+        """Rebuild tables from the last ledger snapshot plus the log records after it"""
+        state, records = self.ledger.recover()
+        if state:
+            self.import_state(state)
+        for record in records:
+            self.apply_event(record)
+        self.synced_seq = records[-1]['seq'] if records else 0
+        self.rejected_events.clear()
+        
+        # Only the scheduler owner compacts the log
+        owner = self.scheduler_lock.acquire()
+        self.ledger.start(snapshot_provider=self.export_state if owner else None)
+        atexit.register(self.ledger.close)
+        
+        if self.ledger.shared:
+            watch_thread = threading.Thread(target=self.watch_events, daemon=True)
+            watch_thread.start()
+    
+    def export_state(self):
+        """Serializable copy of every table plus the last ledger seq applied to each"""
+        state, applied = {}, {}
+        now_mono, now_wall = time.monotonic(), time.time()
+        with self.sync_lock:
+            for game_type in self.registry.game_types:
+                state[game_type] = {}
+                for table_id, table in list(self.registry.tables(game_type).items()):
+                    state[game_type][str(table_id)] = {
+                        "status": table.status, "rate": table.rate, "elapsed_seconds": table.elapsed_seconds,
+                        "run_started": None if table.run_anchor is None else now_wall - (now_mono - table.run_anchor),
+                        "start_time": table.start_time.timestamp() if table.start_time else None,
+                        "session_start_time": table.session_start_time, "last_session": table.last_session,
+                        "ledger_seq": table.ledger_seq, "segments": [list(segment) for segment in table.segments],
+                        "prepaid_seconds": table.prepaid_seconds
+                    }
+                    applied[f"{game_type}:{table_id}"] = table.ledger_seq
+            state['history'] = self.history.export()
+            state['reservations'] = self.reservations.export()
+            state['waitlist'] = self.waitlist.export()
+            # Waitlist events are logged per game type, with no table
+            for game_type in self.registry.game_types:
+                applied[f"{game_type}:None"] = self.waitlist.applied_seq
+        return state, applied
+    
+    def import_state(self, state):
+        """Load tables from a ledger snapshot"""
+        for game_type in self.registry.game_types:
+            for table_id, saved in state.get(game_type, {}).items():
+                table = self.registry.get(game_type, int(table_id))
+                if table is None:
+                    continue
+                self.registry.publish(table.replace(
+                    status=saved['status'], rate=saved['rate'], elapsed_seconds=saved['elapsed_seconds'],
+                    run_anchor=None if saved['run_started'] is None else self.monotonic_at(saved['run_started']),
+                    start_time=datetime.fromtimestamp(saved['start_time']) if saved['start_time'] else None,
+                    session_start_time=saved['session_start_time'], last_session=saved['last_session'],
+                    ledger_seq=saved['ledger_seq'],
+                    segments=tuple(tuple(segment) for segment in saved.get('segments', self.legacy_segments(saved))),
+                    prepaid_seconds=saved.get('prepaid_seconds')
+                ))
+        for session in state.get('history', []):
+            self.history.add(session['game_type'], session['table_id'], session['id'], session)
+        self.rollups.rebuild(self.history.export())
+        for reservation in state.get('reservations', []):
+            self.reservations.add(reservation['id'], reservation)
+        self.waitlist.load(state.get('waitlist', {}))
+    
+    def legacy_segments(self, saved):
+        """One billing segment covering the elapsed time of a table saved before segments were kept"""
+        if saved['status'] == 'idle':
+            return []
+        if saved['run_started'] is not None:
+            return [[saved['run_started'] - saved['elapsed_seconds'], None, saved['rate']]]
+        started = saved['start_time'] or time.time() - saved['elapsed_seconds']
+        return [[started, started + saved['elapsed_seconds'], saved['rate']]]
+    
+    def monotonic_at(self, wall_time):
+        """Translate a wall-clock timestamp into this process's monotonic clock"""
+        return time.monotonic() - (time.time() - wall_time)
+    
+    def commit_event(self, event):
+        """Log a state transition to the ledger, then apply it; returns the logged record"""
+        record = self.ledger.append(event)
+        if self.ledger.shared:
+            # Apply through the feed so every worker applies events in the same order
+            self.sync_events()
+        else:
+            self.apply_event(record)
+        return record
+    
+    def commit_transition(self, table, event):
+        """Commit a transition decided from `table`; returns False if the table had changed by the time it applied.
         
-        # Default users
-        self.users = {
-            'admin': User('admin', 'admin', generate_password_hash('admin123'), 'admin'),
-            'staff1': User('staff1', 'staff1', generate_password_hash('staff123'), 'staff')
+        Workers sharing the SQLite store decide from their own copy of a table, so the event names
+        the table's ledger_seq at decision time and apply_event drops it if another event got there first.
+        """
+        record = self.commit_event(dict(event, expect_seq=table.ledger_seq))
+        if record['seq'] in self.rejected_events:
+            self.rejected_events.discard(record['seq'])
+            return False
+        return True
+    
+    def commit_waitlist_event(self, event):
+        """Commit a waitlist change; serialized so events apply in seq order (the waitlist skips seqs below its last)"""
+        with self.waitlist_lock:
+            return self.commit_event(dict(event, table_id=None))
+    
+    def sync_events(self):
+        """Apply events committed by any worker to the shared store, in seq order"""
+        changed = {}
+        with self.sync_lock:
+            for record in self.ledger.read_since(self.synced_seq):
+                self.apply_event(record)
+                self.synced_seq = record['seq']
+                if record.get('origin') != os.getpid():
+                    changed.setdefault(record['game_type'], set()).add(record['table_id'])
+        
+        # Changes made by other workers still need pushing to this worker's subscribers
+        for game_type, table_ids in changed.items():
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                continue
+            if None in table_ids:
+                table_ids = {table_id for table_id, table in tables.items() if table.status == 'running'}
+            self.mark_changed(game_type, [table_id for table_id in table_ids if table_id in tables])
+    
+    def watch_events(self):
+        """Background follower of the shared event feed"""
+        while self.running:
+            try:
+                time.sleep(0.2)
+                self.sync_events()
+                self.ledger.maybe_compact(self.synced_seq)
+            except Exception as e:
+                print(f"Sync error: {e}")
+    
+    def apply_event(self, event):
+        """Apply a logged state transition to its table; shared by live requests and replay.
+        Returns whether the event changed anything.
+        
+        Tables are never mutated once published: each event swaps in a new Table,
+        so readers always see a consistent table without taking a lock.
+        """
+        game_type = event['game_type']
+        if event['type'] in ['wait_join', 'wait_leave']:
+            return self.apply_waitlist_event(event)
+        
+        table = self.registry.get(game_type, event['table_id'])
+        if table is None or event['seq'] <= table.ledger_seq:
+            return False
+        if event.get('expect_seq', table.ledger_seq) != table.ledger_seq:
+            # Decided from a copy of the table that another worker changed in the meantime
+            self.rejected_events.add(event['seq'])
+            return False
+        
+        kind = event['type']
+        if kind == 'start':
+            changes = {
+                'status': 'running', 'start_time': datetime.fromtimestamp(event['ts']), 'elapsed_seconds': 0.0,
+                'run_anchor': self.monotonic_at(event['ts']), 'session_start_time': event['session_start_time'],
+                'segments': ((event['ts'], None, table.rate),)
+            }
+        elif kind == 'resume':
+            changes = {
+                'status': 'running', 'run_anchor': self.monotonic_at(event['ts']),
+                'segments': table.segments + ((event['ts'], None, table.rate),)
+            }
+        elif kind == 'pause':
+            changes = {
+                'status': 'paused', 'elapsed_seconds': event['elapsed_seconds'], 'run_anchor': None,
+                'segments': self.close_segment(table.segments, event['ts'])
+            }
+        elif kind == 'end':
+            # History inserts are keyed by seq, so replaying an end already in a snapshot is harmless
+            record = self.history.add(game_type, event['table_id'], event['seq'], event['session'])
+            if record:
+                self.rollups.record(record)
+            changes = {
+                'status': 'idle', 'start_time': None, 'elapsed_seconds': 0.0, 'run_anchor': None,
+                'session_start_time': None, 'last_session': dict(event['session'], id=event['seq']), 'segments': (),
+                'prepaid_seconds': None
+            }
+        elif kind == 'rate':
+            changes = {'rate': event['rate']}
+            if table.status == 'running':
+                # A mid-session change closes the current segment and bills the rest at the new rate
+                changes['segments'] = self.close_segment(table.segments, event['ts']) + ((event['ts'], None, event['rate']),)
+        elif kind == 'clear':
+            for record in self.history.clear_table(game_type, event['table_id']):
+                self.rollups.remove(record)
+            changes = {'last_session': None}
+        elif kind == 'prepay':
+            changes = {'prepaid_seconds': event['seconds']}
+        elif kind == 'alert':
+            self.alerts[game_type].append(dict(event['alert'], id=event['seq'], table_id=event['table_id'], ts=event['ts']))
+            changes = {}
+        elif kind == 'reserve':
+            # Overlaps are rejected here too, so workers racing for one slot agree on the winner
+            self.reservations.add(event['seq'], event['reservation'])
+            changes = {}
+        elif kind == 'reserve_update':
+            self.reservations.update(event['reservation_id'], event['changes'])
+            changes = {}
+        elif kind == 'reserve_cancel':
+            self.reservations.cancel(event['reservation_id'])
+            changes = {}
+        else:
+            return False
+        self.registry.publish(table.replace(ledger_seq=event['seq'], **changes))
+        return True
+    
+    def apply_waitlist_event(self, event):
+        """Apply a waitlist change; these belong to a game type, so the waitlist keeps its own applied seq"""
+        if event['seq'] <= self.waitlist.applied_seq:
+            return False
+        if event['type'] == 'wait_join':
+            self.waitlist.add(event['seq'], event['entry'])
+        else:
+            self.waitlist.remove(event['entry_id'])
+        self.waitlist.applied_seq = event['seq']
+        return True
+    
+    def close_segment(self, segments, ts):
+        """Segments with the open (live) one ended at ts"""
+        if not segments or segments[-1][1] is not None:
+            return segments
+        start, _, rate = segments[-1]
+        return segments[:-1] + ((start, ts, rate),)
+    
+    def elapsed_seconds(self, table, now=None):
+        """Billable seconds: accumulated run time plus the live run since the anchor"""
+        elapsed = table.elapsed_seconds
+        if table.status == 'running' and table.run_anchor is not None:
+            elapsed += (now if now is not None else time.monotonic()) - table.run_anchor
+        return elapsed
+    
+    def serialize_table(self, table, now=None, wall=None):
+        """Public view of a table with time and amount derived from the clock and its billing segments"""
+        elapsed = self.elapsed_seconds(table, now)
+        wall = wall if wall is not None else time.time()
+        minutes, seconds = divmod(int(elapsed), 60)
+        return {
+            "status": table.status, "time": f"{minutes:02d}:{seconds:02d}", "rate": table.rate,
+            "current_rate": round(self.registry.tariffs.rate_at(table.rate, wall), 2),
+            "amount": round(self.registry.tariffs.price(table.segments, wall), 2), "start_time": table.start_time,
+            "elapsed_seconds": int(elapsed), "last_session": table.last_session, "prepaid_seconds": table.prepaid_seconds
         }
     
-    def create_table(self, rate):
-        """Create a new table with default values"""
+    def serialize_tables(self, tables):
+        """Serialize a game type's tables against a single clock reading"""
+        now, wall = time.monotonic(), time.time()
+        return {table_id: self.serialize_table(table, now, wall) for table_id, table in list(tables.items())}
+    
+    def tables_payload(self, tables, version, delta):
+        """Body of a get_tables response"""
         return {
-            "status": "idle", "time": "00:00", "rate": rate, "amount": 0.0,
-            "start_time": None, "elapsed_seconds": 0, "sessions": []
+            "success": True, "tables": self.serialize_tables(tables), "available_rates": self.available_rates,
+            "version": version, "delta": delta, "timestamp": datetime.now().isoformat()
         }
     
+    def game_version(self, tables):
+        """Version of a game type's table state: the newest ledger seq applied to any of its tables.
+        
+        Seqs come from the ledger (shared by every worker in SQLite mode), so all workers agree
+        on a version and it keeps increasing across restarts. A table's own version is its ledger_seq.
+        """
+        return max((table.ledger_seq for table in list(tables.values())), default=0)
+    
+    def stream_message(self, game_type):
+        """Live update payload for a game type's subscribers"""
+        tables = self.registry.tables(game_type)
+        return self.app.json.dumps({
+            "tables": self.serialize_tables(tables), "version": self.game_version(tables),
+            "alerts": self.recent_alerts(game_type), "timestamp": datetime.now().isoformat()
+        })
+    
+    def recent_alerts(self, game_type, seconds=300):
+        """Alerts raised in the last few minutes; clients skip the ids they have already shown"""
+        since = time.time() - seconds
+        return [alert for alert in list(self.alerts[game_type]) if alert['ts'] >= since]
+    
+    def subscribe(self, game_type, subscriber=None):
+        """Register a live update queue (or anything with its get_nowait/put_nowait); only the latest state is kept"""
+        subscriber = subscriber or queue.Queue(maxsize=1)
+        with self.subscribers_lock:
+            self.subscribers[game_type].add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, game_type, subscriber):
+        """Remove a live update queue"""
+        with self.subscribers_lock:
+            self.subscribers[game_type].discard(subscriber)
+    
+    def mark_changed(self, game_type, table_ids):
+        """Re-arm the timers of changed tables, drop their cached snapshot and push the new state"""
+        self.schedule_tables(game_type, table_ids)
+        self.snapshots.invalidate(game_type)
+        self.notify_change(game_type)
+    
+    def notify_change(self, game_type):
+        """Push the current state of a game type to its live subscribers"""
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers[game_type])
+        if not subscribers:
+            return
+        
+        message = self.stream_message(game_type)
+        for subscriber in subscribers:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass
+    
     def setup_authentication(self):
         """Configure authentication system"""
         self.login_manager = LoginManager()
@@ -72,23 +514,75 @@ class TableTracker:
         @self.login_manager.user_loader
         def load_user(user_id):
             return self.users.get(user_id)
-    
+
+    def render_page(self, template, game_type, **context):
+        """Serve a rendered page from the page cache, or 304 when the browser already has it"""
+        # Pages show the user's name and role-gated sections; nothing else varies per request
+        key = (template, game_type, current_user.role, current_user.username, request.script_root)
+        body, etag = self.pages.get(key, lambda: render_template(
+            template, game_type=game_type, current_user=current_user, **context
+        ))
+        if etag_matches(request.if_none_match, etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
     def setup_routes(self):
         """Setup all application routes"""
         
+        @self.app.before_request
+        def sync_shared_state():
+            g.request_started = time.perf_counter()
+            if not self.ready.is_set() and request.endpoint not in ['login', 'logout']:
+                self.ready.wait()  # only during startup, while the snapshot is restored
+            if self.restore_error is not None:
+                return jsonify({"error": "Table state could not be restored"}), 503
+            if self.ledger.shared and self.ready.is_set():
+                self.sync_events()
+        
+        @self.app.after_request
+        def record_request_metrics(response):
+            started = g.pop('request_started', None)
+            if started is not None:
+                # Streamed responses (SSE) have no length; they are counted without a size
+                self.metrics.record_request(
+                    request.endpoint or 'unmatched', request.method, response.status_code,
+                    time.perf_counter() - started, None if response.is_streamed else response.content_length
+                )
+            return response
+        
+        # Registered after the metrics hook so it runs first and request sizes are the bytes on the wire
+        @self.app.after_request
+        def compress_response(response):
+            return self.compressor.apply(request, response, g.pop('compress_key', None))
+        
         @self.app.route('/')
         @login_required
         def home():
-            return render_template('home.html', current_user=current_user)
+            return self.render_page('home.html', None, game_types=self.registry.labels)
         
         @self.app.route('/login', methods=['GET', 'POST'])
         def login():
             if request.method == 'POST':
                 username = request.form['username']
                 password = request.form['password']
+                
+                wait = self.login_guard.retry_after(username, request.remote_addr)
+                if wait:
+                    flash(f'Too many failed attempts, try again in {wait} seconds')
+                    return render_template('login.html'), 429
+                
                 user = self.users.get(username)
+                valid = self.login_guard.verify(user.password_hash, password) if user else False
+                if valid is None:
+                    flash('Server busy, please try again')
+                    return render_template('login.html'), 503
                 
-                if user and check_password_hash(user.password_hash, password):
+                self.login_guard.record(username, request.remote_addr, valid)
+                if valid:
                     login_user(user)
                     return redirect(request.args.get('next') or url_for('home'))
                 flash('Invalid credentials')
@@ -103,16 +597,16 @@ class TableTracker:
         @self.app.route('/<game_type>')
         @login_required
         def game_page(game_type):
-            if game_type not in ['snooker', 'pool']:
+            if game_type not in self.registry:
                 return redirect(url_for('home'))
-            return render_template('game.html', game_type=game_type, current_user=current_user)
+            return self.render_page('game.html', game_type, available_rates=self.available_rates)
         
         @self.app.route('/<game_type>/mobile')
         @login_required
         def mobile_page(game_type):
-            if game_type not in ['snooker', 'pool']:
+            if game_type not in self.registry:
                 return redirect(url_for('home'))
-            return render_template('mobile.html', game_type=game_type, current_user=current_user)
+            return self.render_page('mobile.html', game_type)
         
         # API Routes
         self.setup_api_routes()
@@ -148,7 +642,11 @@ class TableTracker:
             if username in self.users:
                 return jsonify({"error": "Username already exists"}), 400
             
-            self.users[username] = User(username, username, generate_password_hash(password), role)
+            password_hash = self.login_guard.hash(password)
+            if password_hash is None:
+                return jsonify({"error": "Server busy, please try again"}), 503
+            
+            self.users.add(username, password_hash, role)
             return jsonify({"success": True, "message": f"{role.title()} user '{username}' created"})
         
         @self.app.route('/api/users/remove', methods=['POST'])
@@ -164,142 +662,871 @@ class TableTracker:
             if username == current_user.username:
                 return jsonify({"error": "Cannot remove yourself"}), 400
             
-            del self.users[username]
+            self.users.remove(username)
             return jsonify({"success": True, "message": f"User '{username}' removed"})
         
+        @self.app.route('/api/reports/revenue')
+        @login_required
+        def revenue_report():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            by = request.args.get('by', 'day')
+            if by not in RevenueRollups.DIMENSIONS:
+                return jsonify({"error": "Invalid grouping"}), 400
+            
+            today = datetime.now().strftime("%Y-%m-%d")
+            date_from, date_to = request.args.get('date_from', today), request.args.get('date_to', today)
+            return jsonify({
+                "success": True, "by": by, "date_from": date_from, "date_to": date_to,
+                "rows": self.rollups.revenue(by, date_from, date_to)
+            })
+        
+        @self.app.route('/metrics')
+        @login_required
+        def metrics():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            statuses = {}
+            for game_type in self.registry.game_types:
+                for status in ['running', 'paused', 'idle']:
+                    statuses[f'game_type="{game_type}",status="{status}"'] = 0
+                for table in list(self.registry.tables(game_type).values()):
+                    statuses[f'game_type="{game_type}",status="{table.status}"'] += 1
+            
+            body = self.metrics.render([
+                ('table_tracker_tables', 'Tables by game type and status.', statuses),
+                ('table_tracker_sessions_stored', 'Completed sessions held in history.', {'': len(self.history)}),
+                ('table_tracker_live_subscribers', 'Open live update streams.', {
+                    f'game_type="{game_type}"': len(subscribers) for game_type, subscribers in self.subscribers.items()
+                })
+            ])
+            return Response(body, mimetype='text/plain; version=0.0.4')
+        
+        @self.app.route('/api/reports/utilization')
+        @login_required
+        def utilization_report():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            open_hours = request.args.get('open_hours', 24, type=float)
+            if not 0 < open_hours <= 24:
+                return jsonify({"error": "Invalid opening hours"}), 400
+            
+            today = datetime.now().strftime("%Y-%m-%d")
+            date_from, date_to = request.args.get('date_from', today), request.args.get('date_to', today)
+            table_count = self.registry.table_count()
+            try:
+                utilization = self.rollups.utilization(date_from, date_to, table_count, open_hours)
+            except ValueError:
+                return jsonify({"error": "Invalid date range"}), 400
+            return jsonify(dict(utilization, success=True, date_from=date_from, date_to=date_to))
+        
+        @self.app.route('/api/reports/reprice', methods=['POST'])
+        @login_required
+        def reprice_sessions():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            data = request.get_json(silent=True) or {}
+            try:
+                schedule = TariffSchedule(data['tariffs']) if 'tariffs' in data else self.registry.tariffs
+            except (AttributeError, KeyError, TypeError, ValueError):
+                return jsonify({"error": "Invalid tariffs"}), 400
+            
+            sessions = self.history.iterate(date_from=data.get('date_from'), date_to=data.get('date_to'))
+            billed = repriced = 0.0
+            count, skipped, changed = 0, 0, []
+            for session, amount in reprice(sessions, schedule):
+                if amount is None:
+                    skipped += 1
+                    continue
+                count += 1
+                billed += session['amount']
+                repriced += amount
+                if abs(amount - session['amount']) >= 0.01 and len(changed) < 500:
+                    changed.append({
+                        "id": session['id'], "game_type": session['game_type'], "table_id": session['table_id'],
+                        "date": session['date'], "billed": session['amount'], "repriced": amount,
+                        "lines": schedule.breakdown(session['segments'], session['segments'][-1][1])
+                    })
+            return jsonify({
+                "success": True, "sessions": count, "skipped": skipped, "billed": round(billed, 2),
+                "repriced": round(repriced, 2), "difference": round(repriced - billed, 2), "changed": changed
+            })
+        
+        @self.app.route('/api/reports/rebuild', methods=['POST'])
+        @login_required
+        def rebuild_reports():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            self.rollups.rebuild(self.history.export())
+            return jsonify({"success": True, "message": "Reports rebuilt from session history"})
+        
         @self.app.route('/api/<game_type>/tables')
         @login_required
         def get_tables(game_type):
-            tables = self.snooker_tables if game_type == 'snooker' else self.pool_tables
-            return jsonify({
-                "success": True, "tables": tables, "available_rates": self.available_rates,
-                "timestamp": datetime.now().isoformat()
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            version = self.game_version(tables)
+            # Running tables' time and amount change every second, so while any runs the body is only good for that second
+            second = int(time.time())
+            running = any(table.status == 'running' for table in list(tables.values()))
+            etag = f"{game_type}-{version}-{second}" if running else f"{game_type}-{version}"
+            if etag_matches(request.if_none_match, etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            
+            since = request.args.get('since', type=int)
+            # A version ahead of ours was not handed out by this ledger (e.g. an old seeded version, or the
+            # data dir was reset), so nothing about it can be trusted: send the full state instead
+            if since is not None and since <= version:
+                # Tables changed by a later event, plus running ones: their time and amount move without events
+                tables = {
+                    table_id: table for table_id, table in list(tables.items())
+                    if table.ledger_seq > since or table.status == 'running'
+                }
+                response = jsonify(self.tables_payload(tables, version, delta=True))
+            else:
+                body = self.snapshots.get(
+                    game_type, (version, second), lambda: self.tables_payload(tables, version, delta=False)
+                )
+                response = Response(body, mimetype='application/json')
+                # The same bytes go to every poller this second, so they are compressed once too
+                g.compress_key = ('tables', game_type, version, second)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        
+        @self.app.route('/api/<game_type>/stream')
+        @login_required
+        def stream_tables(game_type):
+            if game_type not in self.registry:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            subscriber = self.subscribe(game_type)
+            initial = self.stream_message(game_type)
+            
+            def events():
+                try:
+                    yield f"retry: 3000\ndata: {initial}\n\n"
+                    while self.running:
+                        try:
+                            yield f"data: {subscriber.get(timeout=15)}\n\n"
+                        except queue.Empty:
+                            yield ": keepalive\n\n"
+                finally:
+                    self.unsubscribe(game_type, subscriber)
+            
+            return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'
             })
         
+        @self.app.route('/api/batch', methods=['POST'])
+        @login_required
+        def batch_actions():
+            operations = (request.get_json() or {}).get('operations')
+            if not isinstance(operations, list) or not 1 <= len(operations) <= 500:
+                return jsonify({"error": "Invalid operations"}), 400
+            
+            error = self.validate_batch(operations)
+            if error:
+                return jsonify({"error": error}), 400
+            
+            results, changed = self.apply_batch(operations)
+            for game_type, table_ids in changed.items():
+                self.mark_changed(game_type, sorted(table_ids))
+            
+            return jsonify({"success": True, "results": results, "tables": {
+                game_type: self.serialize_tables(self.registry.tables(game_type))
+                for game_type in changed
+            }})
+        
         @self.app.route('/api/<game_type>/table/<int:table_id>/action', methods=['POST'])
         @login_required
         def table_action(game_type, table_id):
             action = request.get_json().get('action')
-            tables = self.snooker_tables if game_type == 'snooker' else self.pool_tables
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
             
             if table_id not in tables or action not in ['start', 'pause', 'end']:
                 return jsonify({"error": "Invalid request"}), 400
             
             result = self.handle_table_action(game_type, table_id, action)
-            return jsonify({"success": True, "result": result, "tables": tables})
+            self.mark_changed(game_type, [table_id])
+            return jsonify({"success": True, "result": result, "tables": self.serialize_tables(tables)})
         
         @self.app.route('/api/<game_type>/table/<int:table_id>/rate', methods=['POST'])
         @login_required
         def update_rate(game_type, table_id):
             new_rate = float(request.get_json().get('rate'))
-            tables = self.snooker_tables if game_type == 'snooker' else self.pool_tables
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
             
             if table_id not in tables or new_rate not in self.available_rates:
                 return jsonify({"error": "Invalid table or rate"}), 400
             
-            if tables[table_id]['status'] != 'idle':
-                return jsonify({"error": "Cannot change rate while table is running"}), 400
-            
-            tables[table_id]['rate'] = new_rate
-            return jsonify({"success": True, "tables": tables})
+            with self.table_lock(game_type, table_id):
+                self.commit_event({'type': 'rate', 'game_type': game_type, 'table_id': table_id, 'rate': new_rate})
+            self.mark_changed(game_type, [table_id])
+            return jsonify({"success": True, "tables": self.serialize_tables(tables)})
         
         @self.app.route('/api/<game_type>/table/<int:table_id>/clear', methods=['POST'])
         @login_required
         def clear_table(game_type, table_id):
-            tables = self.snooker_tables if game_type == 'snooker' else self.pool_tables
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
             
             if table_id not in tables:
                 return jsonify({"error": "Invalid table"}), 400
             
-            tables[table_id]['sessions'] = []
-            return jsonify({"success": True, "tables": tables})
+            with self.table_lock(game_type, table_id):
+                self.commit_event({'type': 'clear', 'game_type': game_type, 'table_id': table_id})
+            self.mark_changed(game_type, [table_id])
+            return jsonify({"success": True, "tables": self.serialize_tables(tables)})
+        
+        @self.app.route('/api/<game_type>/table/<int:table_id>/prepay', methods=['POST'])
+        @login_required
+        def prepay_table(game_type, table_id):
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            minutes = (request.get_json(silent=True) or {}).get('minutes')
+            valid_minutes = (isinstance(minutes, (int, float)) and not isinstance(minutes, bool) and 0 <= minutes <= 1440)
+            if table_id not in tables or (minutes is not None and not valid_minutes):
+                return jsonify({"error": "Invalid table or minutes"}), 400
+            
+            # 0 or null clears the limit
+            with self.table_lock(game_type, table_id):
+                self.commit_event({
+                    'type': 'prepay', 'game_type': game_type, 'table_id': table_id, 'seconds': minutes * 60 if minutes else None
+                })
+            self.mark_changed(game_type, [table_id])
+            return jsonify({"success": True, "tables": self.serialize_tables(tables)})
+        
+        @self.app.route('/api/<game_type>/alerts')
+        @login_required
+        def get_alerts(game_type):
+            if game_type not in self.registry:
+                return jsonify({"error": "Unknown game type"}), 404
+            return jsonify({"success": True, "alerts": self.recent_alerts(game_type)})
+        
+        @self.app.route('/api/<game_type>/reservations')
+        @login_required
+        def list_reservations(game_type):
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            try:
+                start, end = self.reservation_window(request.args, default_hours=24)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            table_id = request.args.get('table_id', type=int)
+            table_ids = [table_id] if table_id is not None else sorted(tables)
+            reservations = [
+                public(reservation) for table_id in table_ids
+                for reservation in self.reservations.between(game_type, table_id, start, end)
+            ]
+            return jsonify({"success": True, "reservations": sorted(reservations, key=lambda item: item['start'])})
+        
+        @self.app.route('/api/<game_type>/free')
+        @login_required
+        def free_slots(game_type):
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            try:
+                start, end = self.reservation_window(request.args, default_hours=24)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            min_seconds = request.args.get('minutes', 0, type=float) * 60
+            return jsonify({"success": True, "tables": [
+                {"table_id": table_id, "slots": [
+                    {"start": format_time(slot_start), "end": format_time(slot_end)}
+                    for slot_start, slot_end in self.reservations.free_slots(game_type, table_id, start, end, min_seconds)
+                ]}
+                for table_id in sorted(tables)
+            ]})
+        
+        @self.app.route('/api/<game_type>/table/<int:table_id>/reservations', methods=['POST'])
+        @login_required
+        def create_reservation(game_type, table_id):
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            data = request.get_json(silent=True) or {}
+            if table_id not in tables or not data.get('name'):
+                return jsonify({"error": "Invalid table or missing name"}), 400
+            try:
+                start, end = self.reservation_window(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            with self.table_lock(game_type, table_id):
+                taken = self.reservations.conflicts(game_type, table_id, start, end)
+                if not taken:
+                    record = self.commit_event({
+                        'type': 'reserve', 'game_type': game_type, 'table_id': table_id,
+                        'reservation': dict(
+                            {field: data.get(field) for field in RESERVATION_FIELDS},
+                            game_type=game_type, table_id=table_id, start=start, end=end, created_by=current_user.username
+                        )
+                    })
+            # Another worker may have taken the slot first; the ledger order decides
+            reservation = None if taken else self.reservations.get(record['seq'])
+            if reservation is None:
+                taken = taken or self.reservations.conflicts(game_type, table_id, start, end)
+                return jsonify({"error": "Table already reserved", "conflicts": [public(item) for item in taken]}), 409
+            return jsonify({"success": True, "reservation": public(reservation)}), 201
+        
+        @self.app.route('/api/reservations/<int:reservation_id>/update', methods=['POST'])
+        @login_required
+        def update_reservation(reservation_id):
+            current = self.reservations.get(reservation_id)
+            if current is None:
+                return jsonify({"error": "Unknown reservation"}), 404
+            
+            data = request.get_json(silent=True) or {}
+            try:
+                start, end = self.reservation_window({
+                    'start': data.get('start', current['start']), 'end': data.get('end', current['end'])
+                })
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            changes = dict({field: data[field] for field in RESERVATION_FIELDS if field in data}, start=start, end=end)
+            
+            game_type, table_id = current['game_type'], current['table_id']
+            with self.table_lock(game_type, table_id):
+                taken = self.reservations.conflicts(game_type, table_id, start, end, ignore=reservation_id)
+                if not taken:
+                    self.commit_event({
+                        'type': 'reserve_update', 'game_type': game_type, 'table_id': table_id,
+                        'reservation_id': reservation_id, 'changes': changes
+                    })
+            reservation = self.reservations.get(reservation_id)
+            if taken or reservation is None or reservation['start'] != start or reservation['end'] != end:
+                taken = taken or self.reservations.conflicts(game_type, table_id, start, end, ignore=reservation_id)
+                return jsonify({"error": "Table already reserved", "conflicts": [public(item) for item in taken]}), 409
+            return jsonify({"success": True, "reservation": public(reservation)})
+        
+        @self.app.route('/api/reservations/<int:reservation_id>/cancel', methods=['POST'])
+        @login_required
+        def cancel_reservation(reservation_id):
+            current = self.reservations.get(reservation_id)
+            if current is None:
+                return jsonify({"error": "Unknown reservation"}), 404
+            
+            with self.table_lock(current['game_type'], current['table_id']):
+                self.commit_event({
+                    'type': 'reserve_cancel', 'game_type': current['game_type'], 'table_id': current['table_id'],
+                    'reservation_id': reservation_id
+                })
+            return jsonify({"success": True, "message": f"Reservation {reservation_id} cancelled"})
+        
+        @self.app.route('/api/<game_type>/waitlist')
+        @login_required
+        def get_waitlist(game_type):
+            if game_type not in self.registry:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            waits = self.waitlist_estimates(game_type)
+            return jsonify({"success": True, "waitlist": [
+                dict(entry, joined=format_time(entry['joined']), position=position,
+                     estimated_wait=None if waits[entry['id']] is None else round(waits[entry['id']] / 60))
+                for position, entry in enumerate(self.waitlist.waiting(game_type), 1)
+            ]})
+        
+        @self.app.route('/api/<game_type>/waitlist', methods=['POST'])
+        @login_required
+        def join_waitlist(game_type):
+            if game_type not in self.registry:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            data = request.get_json(silent=True) or {}
+            party_size, rate = data.get('party_size', 1), data.get('rate')
+            if (not data.get('name') or not isinstance(party_size, int) or isinstance(party_size, bool)
+                    or not 1 <= party_size <= 50):
+                return jsonify({"error": "Name and a party size of 1-50 are required"}), 400
+            if rate is not None and rate not in self.available_rates:
+                return jsonify({"error": "Invalid rate"}), 400
+            
+            record = self.commit_waitlist_event({
+                'type': 'wait_join', 'game_type': game_type,
+                'entry': {
+                    'game_type': game_type, 'name': data['name'], 'phone': data.get('phone'), 'party_size': party_size,
+                    'rate': None if rate is None else float(rate), 'joined': time.time(), 'added_by': current_user.username
+                }
+            })
+            entry = self.waitlist.get(record['seq'])
+            return jsonify({"success": True, "entry": dict(entry, joined=format_time(entry['joined']))}), 201
+        
+        @self.app.route('/api/<game_type>/waitlist/<int:entry_id>/remove', methods=['POST'])
+        @login_required
+        def leave_waitlist(game_type, entry_id):
+            entry = self.waitlist.get(entry_id)
+            if entry is None or entry['game_type'] != game_type:
+                return jsonify({"error": "Unknown waitlist entry"}), 404
+            
+            self.commit_waitlist_event({'type': 'wait_leave', 'game_type': game_type, 'entry_id': entry_id})
+            return jsonify({"success": True, "message": f"{entry['name']} removed from the waitlist"})
+        
+        @self.app.route('/api/<game_type>/waitlist/<int:entry_id>/seat', methods=['POST'])
+        @login_required
+        def seat_party(game_type, entry_id):
+            tables = self.registry.tables(game_type)
+            entry = self.waitlist.get(entry_id)
+            if tables is None or entry is None or entry['game_type'] != game_type:
+                return jsonify({"error": "Unknown waitlist entry"}), 404
+            
+            table_id = (request.get_json(silent=True) or {}).get('table_id')
+            if not isinstance(table_id, int) or isinstance(table_id, bool) or table_id not in tables:
+                return jsonify({"error": "Invalid table"}), 400
+            
+            with self.table_lock(game_type, table_id):
+                if tables[table_id].status != 'idle':
+                    return jsonify({"error": f"Table {table_id} is in use"}), 409
+                self.commit_waitlist_event({'type': 'wait_leave', 'game_type': game_type, 'entry_id': entry_id})
+                result = self.handle_table_action(game_type, table_id, 'start')
+            self.mark_changed(game_type, [table_id])
+            return jsonify({"success": True, "result": result, "tables": self.serialize_tables(tables)})
+        
+        @self.app.route('/api/<game_type>/sessions')
+        @login_required
+        def get_sessions(game_type):
+            if game_type not in self.registry:
+                return jsonify({"error": "Unknown game type"}), 404
+            
+            limit = request.args.get('limit', 20, type=int)
+            if not 1 <= limit <= 200:
+                return jsonify({"error": "Invalid limit"}), 400
+            
+            sessions, next_cursor = self.history.page(
+                game_type=game_type, table_id=request.args.get('table_id', type=int),
+                cursor=request.args.get('cursor', type=int), limit=limit,
+                date_from=request.args.get('date_from'), date_to=request.args.get('date_to'),
+                user=request.args.get('user')
+            )
+            return jsonify({"success": True, "sessions": sessions, "next_cursor": next_cursor})
+        
+        @self.app.route('/api/sessions/summary')
+        @login_required
+        def sessions_summary():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            game_type = request.args.get('game_type')
+            if game_type and game_type not in self.registry:
+                return jsonify({"error": "Invalid game type"}), 400
+            
+            filters = {
+                'game_type': game_type or None, 'date_from': request.args.get('date_from'),
+                'date_to': request.args.get('date_to')
+            }
+            totals = self.history.totals(**filters)
+            return jsonify({
+                "success": True, "sessions": totals['sessions'], "amount": round(totals['amount'], 2),
+                "minutes": round(totals['minutes'], 1),
+                "users": [
+                    {"user": user, "amount": round(amount, 2), "sessions": sessions, "minutes": round(minutes, 1)}
+                    for user, (amount, sessions, minutes) in sorted(self.history.per_user(**filters).items())
+                ]
+            })
+        
+        @self.app.route('/api/sessions/query')
+        @login_required
+        def query_sessions():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            args = request.args
+            game_type, table_id = args.get('game_type'), args.get('table_id', type=int)
+            if (game_type and game_type not in self.registry) or (table_id is not None and not game_type):
+                return jsonify({"error": "Invalid game type or table"}), 400
+            limit = args.get('limit', 200, type=int)
+            if not 1 <= limit <= 1000:
+                return jsonify({"error": "Invalid limit"}), 400
+            
+            # e.g. ?user=staff1&game_type=pool&table_id=2&date_from=2024-05-07&date_to=2024-05-07&min_duration=60
+            sessions, totals = self.history.query(
+                game_type=game_type or None, table_id=table_id, user=args.get('user'),
+                date_from=args.get('date_from'), date_to=args.get('date_to'),
+                min_duration=args.get('min_duration', type=float), max_duration=args.get('max_duration', type=float),
+                min_amount=args.get('min_amount', type=float), max_amount=args.get('max_amount', type=float), limit=limit
+            )
+            return jsonify({
+                "success": True, "sessions": sessions, "count": totals['sessions'], "amount": round(totals['amount'], 2),
+                "minutes": round(totals['minutes'], 1), "truncated": totals['sessions'] > len(sessions)
+            })
+        
+        @self.app.route('/api/sessions/export')
+        @login_required
+        def export_sessions():
+            if current_user.role != 'admin':
+                return jsonify({"error": "Admin access required"}), 403
+            
+            export_format = request.args.get('format', 'csv')
+            if export_format not in ['csv', 'ndjson']:
+                return jsonify({"error": "Invalid format"}), 400
+            
+            game_type, table_id = request.args.get('game_type'), request.args.get('table_id', type=int)
+            if (game_type and game_type not in self.registry) or (table_id is not None and not game_type):
+                return jsonify({"error": "Invalid game type or table"}), 400
+            
+            sessions = self.history.iterate(
+                game_type=game_type, table_id=table_id, date_from=request.args.get('date_from'),
+                date_to=request.args.get('date_to'), user=request.args.get('user')
+            )
+            
+            def rows():
+                # One row at a time: memory stays flat however large the export is
+                if export_format == 'ndjson':
+                    for session in sessions:
+                        yield json.dumps({field: session.get(field) for field in EXPORT_FIELDS}) + '\n'
+                    return
+                
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_FIELDS)
+                for session in sessions:
+                    writer.writerow([session.get(field) for field in EXPORT_FIELDS])
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                yield buffer.getvalue()
+            
+            filename = f"sessions-{request.args.get('date_from', 'all')}-{request.args.get('date_to', 'all')}.{export_format}"
+            return Response(
+                stream_with_context(rows()),
+                mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
         
         @self.app.route('/api/<game_type>/table/<int:table_id>/split', methods=['POST'])
         @login_required
         def split_bill(game_type, table_id):
             players = int(request.get_json().get('players', 0))
-            tables = self.snooker_tables if game_type == 'snooker' else self.pool_tables
+            tables = self.registry.tables(game_type)
+            if tables is None:
+                return jsonify({"error": "Unknown game type"}), 404
             
             if table_id not in tables:
                 return jsonify({"error": "Invalid table"}), 400
             
-            table = tables[table_id]
-            if not table['sessions']:
-                return jsonify({"error": "No sessions to split"}), 400
-            
             if not 1 <= players <= 50:
                 return jsonify({"error": "Invalid number of players"}), 400
             
-            total_amount = table['sessions'][-1]['amount']
+            # Several sessions (e.g. a group that played on and off) can be split as one bill
+            session_ids = request.get_json().get('session_ids')
+            if session_ids:
+                if not isinstance(session_ids, list) or not all(isinstance(session_id, int) for session_id in session_ids):
+                    return jsonify({"error": "Invalid session ids"}), 400
+                total_amount = self.history.amount_of(game_type, table_id, set(session_ids))
+                if total_amount is None:
+                    return jsonify({"error": "Unknown session for this table"}), 400
+                total_amount = round(total_amount, 2)
+            else:
+                table = tables[table_id]
+                if not table.last_session:
+                    return jsonify({"error": "No sessions to split"}), 400
+                total_amount = table.last_session['amount']
             return jsonify({
                 "success": True, "total_amount": total_amount,
                 "players": players, "per_player": total_amount / players
             })
     
-    def handle_table_action(self, game_type, table_id, action):
-        """Handle table state changes"""
-        tables = self.snooker_tables if game_type == 'snooker' else self.pool_tables
-        table = tables[table_id]
+    def waitlist_estimates(self, game_type):
+        """Seconds until each waiting party is likely seated, from running tables and recent session lengths"""
+        since = datetime.fromtimestamp(time.time() - 30 * 86400).strftime("%Y-%m-%d")
+        recent = self.history.totals(game_type=game_type, date_from=since)
+        session_seconds = recent['minutes'] / recent['sessions'] * 60 if recent['sessions'] else 3600
         
-        if action == 'start':
-            if table['status'] == 'idle':
-                table.update({
-                    'status': 'running', 'start_time': datetime.now(), 
-                    'elapsed_seconds': 0, 'session_start_time': datetime.now().strftime("%H:%M:%S")
-                })
-            return f"Table {table_id} started"
-        
-        elif action == 'pause':
-            if table['status'] == 'running':
-                table['status'] = 'paused'
-            elif table['status'] == 'paused':
-                table.update({'status': 'running', 'start_time': datetime.now()})
-            return f"Table {table_id} {'paused' if table['status'] == 'paused' else 'resumed'}"
-        
-        elif action == 'end':
-            if table['status'] in ['running', 'paused']:
-                duration_minutes = table['elapsed_seconds'] / 60
-                amount = duration_minutes * table['rate']
-                
-                session = {
-                    "start_time": table.get('session_start_time', '00:00:00'),
-                    "end_time": datetime.now().strftime("%H:%M:%S"),
-                    "duration": round(duration_minutes, 1),
-                    "amount": round(amount, 2),
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "user": current_user.username
-                }
-                
-                table['sessions'].append(session)
-                table.update({
-                    'status': 'idle', 'time': '00:00', 'amount': 0,
-                    'start_time': None, 'elapsed_seconds': 0, 'session_start_time': None
-                })
-                return f"Table {table_id} ended - ₹{amount:.2f}"
+        now = time.monotonic()
+        free_at = {
+            table_id: (table.rate, 0 if table.status == 'idle' else max(session_seconds - self.elapsed_seconds(table, now), 0))
+            for table_id, table in list(self.registry.tables(game_type).items())
+        }
+        return self.waitlist.estimate(game_type, free_at, session_seconds)
+    
+    def reservation_window(self, data, default_hours=None):
+        """(start, end) epoch seconds from 'start'/'end' (or query 'from'/'to'); raises ValueError"""
+        start, end = data.get('start', data.get('from')), data.get('end', data.get('to'))
+        if default_hours is not None:
+            start = time.time() if start is None else start
+            end = parse_time(start) + default_hours * 3600 if end is None else end
+        if start is None or end is None:
+            raise ValueError("Start and end are required")
+        try:
+            start, end = parse_time(start), parse_time(end)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid start or end time")
+        if end <= start:
+            raise ValueError("End must be after start")
+        return start, end
+    
+    def handle_table_action(self, game_type, table_id, action, user=None):
+        """Handle table state changes; serialized per table, and reports what actually applied"""
+        tables = self.registry.tables(game_type)
+        event = {'game_type': game_type, 'table_id': table_id}
+        
+        with self.table_lock(game_type, table_id):
+            table = tables[table_id]
+            
+            if action == 'start':
+                if table.status == 'idle':
+                    started = dict(event, type='start', session_start_time=datetime.now().strftime("%H:%M:%S"))
+                    if not self.commit_transition(table, started):
+                        return self.superseded(game_type, table_id)
+                    booking = self.reservations.upcoming(game_type, table_id, time.time(), self.reservation_notice)
+                    if booking:
+                        return (f"Table {table_id} started - reserved {format_time(booking['start'])[11:16]}-"
+                                f"{format_time(booking['end'])[11:16]} for {booking['name']}")
+                    return f"Table {table_id} started"
+                elif table.status == 'paused':
+                    if not self.commit_transition(table, dict(event, type='resume')):
+                        return self.superseded(game_type, table_id)
+                    return f"Table {table_id} resumed"
+                return f"Table {table_id} started"
+            
+            elif action == 'pause':
+                if table.status == 'running':
+                    paused = dict(event, type='pause', elapsed_seconds=self.elapsed_seconds(table))
+                    if not self.commit_transition(table, paused):
+                        return self.superseded(game_type, table_id)
+                    return f"Table {table_id} paused"
+                elif table.status == 'paused':
+                    if not self.commit_transition(table, dict(event, type='resume')):
+                        return self.superseded(game_type, table_id)
+                return f"Table {table_id} resumed"
+            
+            elif action == 'end':
+                if table.status in ['running', 'paused']:
+                    duration_minutes = self.elapsed_seconds(table) / 60
+                    ended = time.time()
+                    segments = self.close_segment(table.segments, ended)
+                    amount = self.registry.tariffs.price(segments, ended)
+                    
+                    session = {
+                        "start_time": table.session_start_time or '00:00:00',
+                        "end_time": datetime.now().strftime("%H:%M:%S"),
+                        "duration": round(duration_minutes, 1),
+                        "amount": round(amount, 2),
+                        "date": datetime.now().strftime("%Y-%m-%d"),
+                        "user": user or current_user.username,
+                        "segments": [list(segment) for segment in segments]
+                    }
+                    
+                    if not self.commit_transition(table, dict(event, type='end', session=session)):
+                        return self.superseded(game_type, table_id)
+                    party = self.waitlist.next_for(game_type, table.rate)
+                    if party:
+                        return (f"Table {table_id} ended - ₹{amount:.2f} - next up: {party['name']} "
+                                f"(party of {party['party_size']}, waiting since {format_time(party['joined'])[11:16]})")
+                    return f"Table {table_id} ended - ₹{amount:.2f}"
         
         return "No action taken"
     
+    def superseded(self, game_type, table_id):
+        """Result of a transition dropped because another worker changed the table first"""
+        status = self.registry.get(game_type, table_id).status
+        return f"Table {table_id} was changed from another device and is now {status} - no action taken"
+    
+    def validate_batch(self, operations):
+        """Check every operation up front so a bad one rejects the whole batch"""
+        for index, operation in enumerate(operations):
+            # Type checks first: unhashable JSON values (lists, objects) cannot be looked up
+            if (not isinstance(operation, dict) or not isinstance(operation.get('game_type'), str)
+                    or operation['game_type'] not in self.registry):
+                return f"Operation {index}: invalid game type"
+            
+            table_id = operation.get('table_id')
+            if (not isinstance(table_id, int) or isinstance(table_id, bool)
+                    or table_id not in self.registry.tables(operation['game_type'])):
+                return f"Operation {index}: invalid table"
+            
+            if 'rate' in operation:
+                if operation['rate'] not in self.available_rates:
+                    return f"Operation {index}: invalid rate"
+            elif operation.get('action') not in ['start', 'pause', 'end']:
+                return f"Operation {index}: invalid action"
+        return None
+    
+    def apply_batch(self, operations):
+        """Apply validated operations in order while holding every involved table lock"""
+        keys = sorted({(operation['game_type'], operation['table_id']) for operation in operations})
+        locks = [self.table_lock(game_type, table_id) for game_type, table_id in keys]
+        for lock in locks:
+            lock.acquire()
+        
+        results, changed = [], {}
+        try:
+            for operation in operations:
+                game_type, table_id = operation['game_type'], operation['table_id']
+                if 'rate' in operation:
+                    self.commit_event({
+                        'type': 'rate', 'game_type': game_type, 'table_id': table_id, 'rate': operation['rate']
+                    })
+                    results.append(f"Table {table_id} rate set to ₹{operation['rate']}/min")
+                else:
+                    results.append(self.handle_table_action(game_type, table_id, operation['action']))
+                changed.setdefault(game_type, set()).add(table_id)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        return results, changed
+    
+    def schedule_key(self, table):
+        """What a table's timers depend on; a change in any of these is also what counts as activity"""
+        return (table.status, table.run_anchor, table.prepaid_seconds)
+    
+    def schedule_tables(self, game_type, table_ids):
+        """Re-arm the timers of tables whose schedule changed; O(1) per table, unchanged tables are skipped"""
+        now, wall = time.monotonic(), time.time()
+        for table_id in table_ids:
+            table = self.registry.get(game_type, table_id)
+            if table is None:
+                continue
+            key = self.schedule_key(table)
+            with self.table_timers_lock:
+                current = self.table_timers.get((game_type, table_id))
+                if current and current[0] == key:
+                    continue
+                for timer in current[1] if current else []:
+                    self.scheduler.cancel(timer)
+                
+                timers = []
+                if table.status == 'running':
+                    arm = lambda delay, kind: timers.append(
+                        self.scheduler.arm(wall + delay, self.fire_table_timer, game_type, table_id, kind, key)
+                    )
+                    if table.prepaid_seconds:
+                        remaining = table.prepaid_seconds - self.elapsed_seconds(table, now)
+                        if remaining > self.alert_minutes * 60:
+                            arm(remaining - self.alert_minutes * 60, 'prepaid_warning')
+                        arm(max(remaining, 0), 'prepaid_limit')
+                    if self.auto_pause:
+                        arm(self.auto_pause, 'inactive')
+                self.table_timers[(game_type, table_id)] = (key, timers)
+    
+    def fire_table_timer(self, game_type, table_id, kind, key):
+        """Alert or auto-action for one table, unless it changed since the timer was armed"""
+        if not self.scheduler_lock.acquire():
+            return  # another worker on this host owns the scheduler
+        with self.table_lock(game_type, table_id):
+            table = self.registry.get(game_type, table_id)
+            if self.schedule_key(table) != key:
+                return
+            if kind == 'prepaid_warning':
+                message = f"Table {table_id}: {self.alert_minutes:g} minutes of prepaid time left"
+            elif kind == 'prepaid_limit':
+                self.handle_table_action(game_type, table_id, 'pause')
+                message = f"Table {table_id}: prepaid time used up - paused"
+            else:
+                self.handle_table_action(game_type, table_id, 'pause')
+                message = f"Table {table_id}: paused after {self.auto_pause / 60:g} minutes without activity"
+            self.raise_alert(game_type, table_id, kind, message)
+        self.mark_changed(game_type, [table_id])
+    
+    def raise_alert(self, game_type, table_id, kind, message):
+        """Log an alert; it reaches connected UIs with the next live update of its game type"""
+        self.commit_event({
+            'type': 'alert', 'game_type': game_type, 'table_id': table_id, 'alert': {'kind': kind, 'message': message}
+        })
+    
+    def schedule_closing(self):
+        """Arm the end-of-day close for the next CLOSING_TIME"""
+        if not self.closing_time:
+            return
+        hours, minutes = map(int, self.closing_time.split(':'))
+        now = datetime.now()
+        closing = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+        if closing <= now:
+            closing += timedelta(days=1)
+        self.scheduler.arm(closing.timestamp(), self.close_day)
+    
+    def close_day(self):
+        """End every running or paused table at closing time, then arm tomorrow's close"""
+        try:
+            if not self.scheduler_lock.acquire():
+                return
+            for game_type in self.registry.game_types:
+                closed = []
+                for table_id, table in list(self.registry.tables(game_type).items()):
+                    if table.status == 'idle':
+                        continue
+                    with self.table_lock(game_type, table_id):
+                        result = self.handle_table_action(game_type, table_id, 'end', user='system')
+                        self.raise_alert(game_type, table_id, 'closing', f"Closing time: {result}")
+                    closed.append(table_id)
+                if closed:
+                    self.mark_changed(game_type, closed)
+        finally:
+            self.schedule_closing()
+    
+    def next_timer_tick(self):
+        """Wall-clock time of the next timer interval boundary"""
+        now = time.time()
+        return now + self.timer_interval - now % self.timer_interval
+    
+    def timer_tick(self, wake_at):
+        """Refresh live subscribers of running tables; only the scheduler owner on the host acts"""
+        if not self.ready.is_set():
+            return
+        drift = time.time() - wake_at
+        self.timer_drift.append(drift)
+        if not self.scheduler_lock.acquire():
+            self.metrics.record_tick(drift)
+            return  # another worker on this host owns the scheduler
+        tick_started = time.perf_counter()
+        self.ledger.snapshot_provider = self.export_state
+        
+        for game_type in self.registry.game_types:
+            tables = self.registry.tables(game_type)
+            running = [table_id for table_id, table in tables.items() if table.status == 'running']
+            if running:
+                if self.ledger.shared:
+                    self.ledger.append({'type': 'tick', 'game_type': game_type, 'table_id': None})
+                self.mark_changed(game_type, running)
+        self.metrics.record_tick(drift, time.perf_counter() - tick_started)
+    
     def update_timers(self):
-        """Background timer for running tables"""
+        """Background timer thread for WSGI servers; the ASGI mode runs timer_tick as an event-loop task"""
         while self.running:
             try:
-                for tables in [self.snooker_tables, self.pool_tables]:
-                    for table in tables.values():
-                        if table['status'] == 'running' and table['start_time']:
-                            table['elapsed_seconds'] += 1
-                            minutes, seconds = divmod(table['elapsed_seconds'], 60)
-                            table['time'] = f"{minutes:02d}:{seconds:02d}"
-                            table['amount'] = (table['elapsed_seconds'] / 60) * table['rate']
-                            table['start_time'] = datetime.now()
-                time.sleep(1)
+                wake_at = self.next_timer_tick()
+                time.sleep(max(0.0, wake_at - time.time()))
+                self.timer_tick(wake_at)
             except Exception as e:
                 print(f"Timer error: {e}")
                 time.sleep(1)
 
-# Initialize app
-app_instance = TableTracker()
-app = app_instance.app
+# Initialize app (asgi.py sets SERVER_MODE=asgi and schedules the timers on its event loop).
+# With VENUES_CONFIG this process instead serves one isolated tracker per venue it owns.
+start_timers = os.environ.get('SERVER_MODE', 'wsgi') != 'asgi'
+if os.environ.get('VENUES_CONFIG'):
+    app_instance = None
+    app = VenueDispatcher.from_env(lambda **venue: TableTracker(start_timers=start_timers, **venue))
+else:
+    app_instance = TableTracker(start_timers=start_timers)
+    app = app_instance.app
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    if app_instance is None:
+        # The venue dispatcher is a plain WSGI app, not a Flask app with .run()
+        run_simple('0.0.0.0', port, app, threaded=True)
+    else:
+        app.run(host='0.0.0.0', port=port, debug=False)
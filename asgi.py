@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+ASGI Mode - the same TableTracker served from an asyncio event loop
+Features: Event-loop live streams, Timer ticks as a loop task, Flask routes and auth on a bounded thread pool
+
+Run with any ASGI server, e.g. `uvicorn asgi:app` or
+`gunicorn -k uvicorn.workers.UvicornWorker asgi:app`. With VENUES_CONFIG set, each venue this
+process serves gets its own wrapper under /v/<venue>/.
+"""
+
+import asyncio
+import io
+import os
+import queue
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('SERVER_MODE', 'asgi')
+
+from flask_login import current_user
+from app import app as wsgi_app, app_instance
+from venues import VENUE_PATH
+
+STREAM_PATH = re.compile(r'^/api/([^/]+)/stream$')
+
+class Broadcast:
+    """One tracker subscriber per game type that fans the latest state out to every open stream on the loop"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.message = None
+        self.changed = asyncio.Event()
+        self.listeners = 0
+
+    def get_nowait(self):
+        raise queue.Empty  # nothing is ever queued; publish always replaces the latest message
+
+    def put_nowait(self, message):
+        """Called by the tracker from any thread"""
+        self.loop.call_soon_threadsafe(self.publish, message)
+
+    def publish(self, message):
+        self.message = message
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+class WSGIBridge:
+    """Runs a WSGI app for ASGI HTTP requests on a bounded thread pool"""
+
+    def __init__(self, wsgi_app, threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-wsgi')
+
+    def run(self, function, *args):
+        return asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    async def call_wsgi(self, scope, receive, send):
+        """Run the WSGI app for one buffered request on the thread pool"""
+        body, more_body = b'', True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        await self.run(self.wsgi_response, self.environ(scope, body), asyncio.get_event_loop(), send)
+
+    def wsgi_response(self, environ, loop, send):
+        """Drive the WSGI app on a pool thread, handing each chunk to the loop before producing the next.
+
+        Streamed responses such as the session export therefore go out as they are generated
+        and never sit in memory whole; a slow client simply holds the pool thread.
+        """
+        started = {}
+
+        def deliver(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def write(chunk):
+            if not started.get('sent'):
+                started['sent'] = True
+                headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in started['headers']]
+                deliver({'type': 'http.response.start', 'status': int(started['status'].split(' ', 1)[0]), 'headers': headers})
+            if chunk:
+                deliver({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            started['status'], started['headers'] = status, headers
+            return write
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+            write(b'')
+            deliver({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def environ(self, scope, body):
+        """WSGI environ for an ASGI HTTP scope"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'], 'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0], 'SERVER_PORT': str(server[1]), 'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}", 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': True, 'wsgi.run_once': False
+        }
+        for name, value in scope.get('headers', []):
+            name, value = name.decode('latin-1'), value.decode('latin-1')
+            if name == 'content-type':
+                key = 'CONTENT_TYPE'
+            elif name in ('content-length', 'transfer-encoding'):
+                continue  # the body is already buffered; its real length is set above
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in environ:
+                value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+            environ[key] = value
+        return environ
+
+class TableTrackerASGI(WSGIBridge):
+    """ASGI 3 application: live streams and timers are loop tasks, everything else runs the Flask app on a thread pool"""
+
+    def __init__(self, tracker, threads=32, keepalive=15):
+        super().__init__(tracker.app, threads)
+        self.tracker = tracker
+        self.flask_app = tracker.app
+        self.keepalive = keepalive
+        self.broadcasts = {}
+        self.timer_task = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        self.start_timers()
+
+        match = STREAM_PATH.match(scope['path'])
+        if match and scope['method'] == 'GET':
+            environ = self.environ(scope, b'')
+            if await self.run(self.authorize, environ, match.group(1)):
+                return await self.stream(match.group(1), receive, send)
+        await self.call_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start_timers()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def shutdown(self):
+        self.tracker.running = False
+        if self.timer_task:
+            self.timer_task.cancel()
+        self.executor.shutdown(wait=False)
+
+    def start_timers(self):
+        if self.timer_task is None:
+            self.timer_task = asyncio.ensure_future(self.run_timers())
+
+    async def run_timers(self):
+        """Timer loop as an event-loop task; the tick itself may touch the ledger, so it runs on the pool"""
+        while self.tracker.running:
+            wake_at = self.tracker.next_timer_tick()
+            await asyncio.sleep(max(0.0, wake_at - time.time()))
+            try:
+                await self.run(self.tracker.timer_tick, wake_at)
+            except Exception as e:
+                print(f"Timer error: {e}")
+
+    def authorize(self, environ, game_type):
+        """Same session and login checks as the Flask route; failures are answered by the Flask route itself"""
+        with self.flask_app.request_context(environ):
+            return game_type in self.tracker.registry and current_user.is_authenticated
+
+    async def stream(self, game_type, receive, send):
+        """Server-sent events for one client; an idle stream is a parked coroutine, not a thread"""
+        broadcast = self.broadcasts.get(game_type)
+        if broadcast is None:
+            broadcast = self.broadcasts[game_type] = Broadcast(asyncio.get_event_loop())
+        if broadcast.listeners == 0:
+            self.tracker.subscribe(game_type, broadcast)
+        broadcast.listeners += 1
+
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            initial = await self.run(self.tracker.stream_message, game_type)
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]})
+            await send({'type': 'http.response.body', 'body': f"retry: 3000\ndata: {initial}\n\n".encode(), 'more_body': True})
+
+            while self.tracker.running:
+                changed = asyncio.ensure_future(broadcast.changed.wait())
+                done, _ = await asyncio.wait(
+                    [changed, disconnected], timeout=self.keepalive, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected in done:
+                    changed.cancel()
+                    return
+                if changed in done:
+                    chunk = f"data: {broadcast.message}\n\n"
+                else:
+                    changed.cancel()
+                    chunk = ": keepalive\n\n"
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            broadcast.listeners -= 1
+            if broadcast.listeners == 0:
+                self.tracker.unsubscribe(game_type, broadcast)
+
+    async def wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+class VenueDispatcherASGI(WSGIBridge):
+    """ASGI counterpart of VenueDispatcher: /v/<venue>/... goes to that venue's own TableTrackerASGI,
+    anything else (venue index, venues owned by other processes) to the WSGI dispatcher"""
+
+    def __init__(self, dispatcher, threads=32):
+        super().__init__(dispatcher, threads=4)
+        self.venues = {venue: TableTrackerASGI(tracker, threads) for venue, tracker in dispatcher.trackers.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        match = VENUE_PATH.match(scope['path'])
+        venue_app = self.venues.get(match.group(1)) if match else None
+        if venue_app is None:
+            return await self.call_wsgi(scope, receive, send)
+        await venue_app(dict(
+            scope, root_path=scope.get('root_path', '') + f'/v/{match.group(1)}', path=match.group(2) or '/'
+        ), receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                for venue_app in self.venues.values():
+                    venue_app.start_timers()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for venue_app in self.venues.values():
+                    venue_app.shutdown()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+if app_instance is None:
+    app = VenueDispatcherASGI(wsgi_app, threads=int(os.environ.get('ASGI_THREADS', 32)))
+else:
+    app = TableTrackerASGI(app_instance, threads=int(os.environ.get('ASGI_THREADS', 32)))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Login Guard - password hashing kept off the request threads
+Features: Bounded hashing pool, Per-user and per-IP failure throttling, Lockouts
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class LoginGuard:
+    """Runs password hashing on a small pool and throttles repeated failed logins"""
+
+    def __init__(self, workers=2, max_pending=16, timeout=10, limits=None, window=300, lockout=300):
+        # A couple of hashing threads bound the CPU a login burst can take from timer polls
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+        self.timeout = timeout
+        self.limits = limits or {'user': 5, 'ip': 20}
+        self.window = window
+        self.lockout = lockout
+
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.locked_until = {}
+
+    def run(self, function, *args):
+        """Run a hashing call on the pool; returns None when the pool is saturated or too slow"""
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            future = self.pool.submit(function, *args)
+        except RuntimeError:
+            self.slots.release()
+            return None
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            return None
+
+    def verify(self, password_hash, password):
+        """True/False for a password check, None if it could not be run right now"""
+        return self.run(check_password_hash, password_hash, password)
+
+    def hash(self, password):
+        """Hash a new password on the pool; None if it could not be run right now"""
+        return self.run(generate_password_hash, password)
+
+    def keys(self, username, ip):
+        return [('user', username), ('ip', ip)]
+
+    def retry_after(self, username, ip):
+        """Seconds until this user and address may try again; 0 if they are not locked out"""
+        now = time.time()
+        with self.lock:
+            until = max(self.locked_until.get(key, 0) for key in self.keys(username, ip))
+        return max(0, int(until - now + 0.999))
+
+    def record(self, username, ip, success):
+        """Count a login outcome; enough failures inside the window lock the user or address out"""
+        now = time.time()
+        with self.lock:
+            if success:
+                self.failures.pop(('user', username), None)
+                self.locked_until.pop(('user', username), None)
+                return
+
+            if len(self.failures) > 10000:
+                self.prune(now)
+            for key in self.keys(username, ip):
+                count, first = self.failures.get(key, (0, now))
+                if now - first > self.window:
+                    count, first = 0, now
+                count += 1
+                self.failures[key] = (count, first)
+                if count >= self.limits[key[0]]:
+                    self.locked_until[key] = now + self.lockout
+                    del self.failures[key]
+
+    def prune(self, now):
+        """Forget failure counts and lockouts that have expired"""
+        self.failures = {key: value for key, value in self.failures.items() if now - value[1] <= self.window}
+        self.locked_until = {key: until for key, until in self.locked_until.items() if until > now}
+
+    def close(self):
+        self.pool.shutdown(wait=False)
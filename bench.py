@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Benchmark - load and latency harness for the table tracker
+Features: Flask test client or local gunicorn socket, Poll/action mix, Latency percentiles, Timer drift, JSON results
+
+Usage:
+    python bench.py --mode client --clients 20 --tables 10 --duration 10 --output results.json
+    python bench.py --mode gunicorn --threads 32 --baseline results.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+GAME_TYPES = ['snooker', 'pool']
+ACTIONS = ['start', 'pause', 'end', 'rate', 'split']
+
+class TestClient:
+    """Requests through Flask's test client, in this process"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, form=None):
+        response = self.client.open(path, method=method, json=body, data=form)
+        response.close()
+        return response.status_code
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__('localhost', timeout=30)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+class SocketClient:
+    """Keep-alive HTTP requests to a local gunicorn over its unix socket"""
+
+    def __init__(self, socket_path):
+        self.conn = UnixConnection(socket_path)
+        self.cookie = None
+
+    def request(self, method, path, body=None, form=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            payload = '&'.join(f"{key}={value}" for key, value in form.items())
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        else:
+            payload = None
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            raise
+        cookie = response.getheader('Set-Cookie')
+        if cookie and cookie.startswith('session='):
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list, in milliseconds"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return round(values[index] * 1000, 3)
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    return {
+        "count": len(samples), "p50_ms": percentile(samples, 50), "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99), "max_ms": round(samples[-1] * 1000, 3) if samples else None
+    }
+
+def rss_kb(pid):
+    """Resident set size of a process and its children (Linux /proc), or None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, StopIteration, ValueError):
+        return None
+    return rss + sum(rss_kb(child) or 0 for child in children)
+
+def write_config(path, tables, rate):
+    config = {
+        "available_rates": [2.0, 3.0, 3.5, 4.0, 4.5, 5.0, 5.5, 6.0, 6.5],
+        "game_types": {game_type: {"count": tables, "rate": rate} for game_type in GAME_TYPES}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+def seed_history(tracker, sessions, tables):
+    """Preload completed sessions through the ledger, as if earlier shifts had run"""
+    now = datetime.now()
+    for index in range(sessions):
+        game_type = GAME_TYPES[index % len(GAME_TYPES)]
+        tracker.commit_event({
+            'type': 'end', 'game_type': game_type, 'table_id': index % tables + 1,
+            'session': {
+                'start_time': now.strftime("%H:%M:%S"), 'end_time': now.strftime("%H:%M:%S"),
+                'duration': 30.0, 'amount': 90.0, 'date': now.strftime("%Y-%m-%d"), 'user': 'admin'
+            }
+        })
+
+def run_client(client, args, deadline, stats, rng):
+    """One simulated screen: mostly polls, with table actions mixed in"""
+    while time.time() < deadline:
+        game_type = rng.choice(GAME_TYPES)
+        if rng.random() < args.action_ratio:
+            action = rng.choice(ACTIONS)
+            table_id = rng.randint(1, args.tables)
+            base = f'/api/{game_type}/table/{table_id}'
+            if action == 'rate':
+                method, path, body = 'POST', f'{base}/rate', {'rate': rng.choice([3.0, 4.0, 5.0])}
+            elif action == 'split':
+                method, path, body = 'POST', f'{base}/split', {'players': rng.randint(2, 6)}
+            else:
+                method, path, body = 'POST', f'{base}/action', {'action': action}
+            kind = action
+        else:
+            method, path, body, kind = 'GET', f'/api/{game_type}/tables', None, 'poll'
+
+        started = time.perf_counter()
+        try:
+            status = client.request(method, path, body)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - started
+
+        with stats['lock']:
+            stats['latency'].setdefault(kind, []).append(elapsed)
+            if status is None or status >= 500:
+                stats['errors'] += 1
+            elif status >= 400:
+                stats['rejected'] += 1  # e.g. splitting the bill of a table that has no sessions yet
+
+def start_gunicorn(args, env, workdir):
+    socket_path = os.path.join(workdir, 'bench.sock')
+    command = [
+        sys.executable, '-m', 'gunicorn', '--worker-class', 'gthread', '--threads', str(args.threads),
+        '--workers', str(args.workers), '--bind', f'unix:{socket_path}', '--log-level', 'warning', 'app:app'
+    ]
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(300):
+        if os.path.exists(socket_path):
+            try:
+                SocketClient(socket_path).request('GET', f'/api/{GAME_TYPES[0]}/tables')
+                return process, socket_path
+            except OSError:
+                pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+def compare(results, baseline_path):
+    """Relative change against a previous results file"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    changes = {}
+    for key in ['throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms']:
+        before, after = baseline['overall'].get(key), results['overall'].get(key)
+        if before and after is not None:
+            changes[key] = round(100 * (after - before) / before, 1)
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Table tracker load and latency benchmark")
+    parser.add_argument('--mode', choices=['client', 'gunicorn'], default='client')
+    parser.add_argument('--clients', type=int, default=20, help="concurrent simulated screens")
+    parser.add_argument('--tables', type=int, default=10, help="tables per game type")
+    parser.add_argument('--history', type=int, default=2000, help="completed sessions preloaded before the run")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of load")
+    parser.add_argument('--action-ratio', type=float, default=0.1, help="share of requests that are table actions")
+    parser.add_argument('--backend', choices=['file', 'sqlite'], default='file')
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn workers (gunicorn mode)")
+    parser.add_argument('--threads', type=int, default=32, help="gunicorn threads per worker (gunicorn mode)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--baseline', help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='table-tracker-bench-')
+    config_path = os.path.join(workdir, 'tables.json')
+    write_config(config_path, args.tables, 4.0)
+    env = dict(os.environ, DATA_DIR=os.path.join(workdir, 'data'), TABLES_CONFIG=config_path,
+               STATE_BACKEND=args.backend, TIMER_INTERVAL='1')
+    os.environ.update(env)
+
+    process = tracker = None
+    try:
+        if args.mode == 'client':
+            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+            import app as app_module
+            tracker = app_module.app_instance
+            tracker.ready.wait()
+            seed_history(tracker, args.history, args.tables)
+            make_client = lambda: TestClient(app_module.app)
+            server_pid = os.getpid()
+        else:
+            # Seed through an in-process tracker first, so the server recovers the history from the ledger
+            if args.history:
+                seeder = subprocess.run([
+                    sys.executable, '-c',
+                    "import sys, app, bench; app.app_instance.ready.wait(); bench.seed_history(app.app_instance, int(sys.argv[1]), int(sys.argv[2])); "
+                    "app.app_instance.ledger.close()",
+                    str(args.history), str(args.tables)
+                ], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+                seeder.check_returncode()
+            process, socket_path = start_gunicorn(args, env, workdir)
+            make_client = lambda: SocketClient(socket_path)
+            server_pid = process.pid
+
+        clients = []
+        for _ in range(args.clients):
+            client = make_client()
+            client.request('POST', '/login', form={'username': 'admin', 'password': 'admin123'})
+            clients.append(client)
+
+        rss_before = rss_kb(server_pid)
+        drift_before = len(tracker.timer_drift) if tracker else 0
+        stats = {'lock': threading.Lock(), 'latency': {}, 'errors': 0, 'rejected': 0}
+        started = time.time()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(target=run_client, args=(client, args, deadline, stats, random.Random(args.seed + index)))
+            for index, client in enumerate(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.time() - started
+        rss_after = rss_kb(server_pid)
+
+        all_samples = [sample for samples in stats['latency'].values() for sample in samples]
+        drift = sorted(list(tracker.timer_drift)[drift_before:]) if tracker else []
+        results = {
+            "config": {key: value for key, value in vars(args).items() if key not in ['output', 'baseline']},
+            "timestamp": datetime.now().isoformat(),
+            "overall": dict(latency_summary(all_samples), throughput_rps=round(len(all_samples) / wall, 1),
+                            errors=stats['errors'], rejected=stats['rejected']),
+            "endpoints": {kind: latency_summary(samples) for kind, samples in sorted(stats['latency'].items())},
+            # Only measurable in-process; gunicorn workers keep their own samples
+            "timer_drift": {
+                "ticks": len(drift), "p50_ms": percentile(drift, 50), "max_ms": percentile(drift, 100)
+            } if tracker else None,
+            "memory": {
+                "rss_before_kb": rss_before, "rss_after_kb": rss_after,
+                "growth_kb": rss_after - rss_before if rss_before and rss_after else None
+            },
+            "sessions": len(tracker.history.export()) if tracker else None
+        }
+        if args.baseline:
+            results["change_vs_baseline_pct"] = compare(results, args.baseline)
+
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        print(output)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+        if tracker:
+            tracker.running = False
+            tracker.ledger.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Session History - completed sessions kept apart from live table state
+Features: Idempotent inserts keyed by ledger seq, Per-table/game/user/date indexes, Cursor pagination, Columnar storage, Array scans
+
+Sessions are stored column by column in typed arrays, one row per session ordered by id.
+Game types, dates and users are interned to small integer codes, clock times are integer
+seconds after midnight and billing segments live in one flat array of (start, end, rate)
+triples. Callers never see the columns: every read builds the usual session dict.
+
+Filtered reads start from the most selective secondary index (sorted session ids per table,
+game type, user and date, with the dates kept sorted for range bisection) and check the other
+filters only on those candidates, so they cost time in proportion to the candidates.
+"""
+
+import bisect
+import heapq
+import math
+import threading
+from array import array
+
+FIELDS = ['start_time', 'end_time', 'duration', 'amount', 'date', 'user', 'segments', 'id', 'game_type', 'table_id']
+
+def clock_seconds(value):
+    """'HH:MM:SS' -> seconds after midnight"""
+    hours, minutes, seconds = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+def index_add(index, key, session_id):
+    """Add an id to a sorted id array in an index; ids almost always arrive in order"""
+    ids = index.get(key)
+    if ids is None:
+        ids = index[key] = array('q')
+    if not ids or ids[-1] < session_id:
+        ids.append(session_id)
+    else:
+        ids.insert(bisect.bisect_left(ids, session_id), session_id)
+
+def clock_string(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class Interned:
+    """Repeated strings stored once and referred to by code"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def matching(self, accept):
+        """Codes of every stored value accepted by a predicate"""
+        return {code for code, value in enumerate(self.values) if accept(value)}
+
+class SessionHistory:
+    """Completed sessions addressed by id (the seq of the ledger event that ended them)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.games, self.dates, self.users = Interned(), Interned(), Interned()
+        self.ids = array('q')
+        self.game = array('H')
+        self.table = array('l')
+        self.date = array('L')
+        self.user = array('L')
+        self.start = array('l')
+        self.end = array('l')
+        self.duration = array('d')
+        self.amount = array('d')
+        self.segment_at = array('q')
+        self.segment_count = array('l')
+        self.segment_values = array('d')
+        # Keys outside the usual shape (rare; e.g. written by other tools) are kept as-is
+        self.extras = {}
+        # Secondary indexes: sorted session ids per (game type, table), game code, user code and date
+        self.table_ids = {}
+        self.game_ids = {}
+        self.user_ids = {}
+        self.date_ids = {}
+        self.date_keys = []
+
+    def columns(self):
+        return [self.ids, self.game, self.table, self.date, self.user, self.start, self.end,
+                self.duration, self.amount, self.segment_at, self.segment_count]
+
+    def row(self, session_id):
+        """Row index of a session id, or None"""
+        position = bisect.bisect_left(self.ids, session_id)
+        return position if position < len(self.ids) and self.ids[position] == session_id else None
+
+    def view(self, position):
+        """The session dict for a row"""
+        at, count = self.segment_at[position], self.segment_count[position]
+        values = self.segment_values
+        session = {
+            "start_time": clock_string(self.start[position]), "end_time": clock_string(self.end[position]),
+            "duration": self.duration[position], "amount": self.amount[position],
+            "date": self.dates.values[self.date[position]], "user": self.users.values[self.user[position]],
+            "segments": [
+                [values[index], None if math.isnan(values[index + 1]) else values[index + 1], values[index + 2]]
+                for index in range(at, at + 3 * count, 3)
+            ],
+            "id": self.ids[position], "game_type": self.games.values[self.game[position]],
+            "table_id": self.table[position]
+        }
+        session_id = self.ids[position]
+        if session_id in self.extras:
+            session.update(self.extras[session_id])
+        return session
+
+    def add(self, game_type, table_id, session_id, session):
+        """Record a completed session; returns None for a replay of an id already stored"""
+        with self.lock:
+            position = bisect.bisect_left(self.ids, session_id)
+            if position < len(self.ids) and self.ids[position] == session_id:
+                return None
+
+            segments = session.get('segments') or []
+            at = len(self.segment_values)
+            for start, end, rate in segments:
+                # An open segment (end None) is stored as NaN
+                self.segment_values.extend((start, float('nan') if end is None else end, rate))
+
+            values = [
+                session_id, self.games.code(game_type), table_id, self.dates.code(session['date']),
+                self.users.code(session['user']), clock_seconds(session['start_time']),
+                clock_seconds(session['end_time']), session['duration'], session['amount'], at, len(segments)
+            ]
+            for column, value in zip(self.columns(), values):
+                if position == len(column):
+                    column.append(value)
+                else:
+                    column.insert(position, value)
+
+            extras = {key: value for key, value in session.items() if key not in FIELDS}
+            if extras:
+                self.extras[session_id] = extras
+
+            index_add(self.table_ids, (game_type, table_id), session_id)
+            index_add(self.game_ids, self.game[position], session_id)
+            index_add(self.user_ids, self.user[position], session_id)
+            if session['date'] not in self.date_ids:
+                bisect.insort(self.date_keys, session['date'])
+            index_add(self.date_ids, session['date'], session_id)
+            return self.view(position)
+
+    def clear_table(self, game_type, table_id):
+        """Drop every session recorded for a table and return them"""
+        with self.lock:
+            ids = self.table_ids.pop((game_type, table_id), None)
+            if not ids:
+                return []
+            positions = [self.row(session_id) for session_id in ids]
+            removed = [self.view(position) for position in positions]
+
+            # Rebuild the columns without the cleared rows, compacting the segment array as we go
+            dropped = set(positions)
+            kept = [position for position in range(len(self.ids)) if position not in dropped]
+            segment_values = array('d')
+            segment_at = array('q')
+            for position in kept:
+                at, count = self.segment_at[position], self.segment_count[position]
+                segment_at.append(len(segment_values))
+                segment_values.extend(self.segment_values[at:at + 3 * count])
+            for column in self.columns():
+                if column is not self.segment_at:
+                    column[:] = array(column.typecode, [column[position] for position in kept])
+            self.segment_at, self.segment_values = segment_at, segment_values
+            for session_id in ids:
+                self.extras.pop(session_id, None)
+            cleared = set(ids)
+            for index in (self.game_ids, self.user_ids, self.date_ids):
+                for key, index_ids in list(index.items()):
+                    index_ids = array('q', [session_id for session_id in index_ids if session_id not in cleared])
+                    if index_ids:
+                        index[key] = index_ids
+                    else:
+                        del index[key]
+            self.date_keys = [date for date in self.date_keys if date in self.date_ids]
+            return removed
+
+    def last(self, game_type, table_id):
+        """Most recent session for a table, or None"""
+        with self.lock:
+            ids = self.table_ids.get((game_type, table_id))
+            return self.view(self.row(ids[-1])) if ids else None
+
+    def matcher(self, game_type=None, table_id=None, date_from=None, date_to=None, user=None):
+        """Row predicate for the filters, comparing interned codes rather than strings"""
+        checks = []
+        if game_type is not None:
+            game = self.games.codes.get(game_type, -1)
+            checks.append(lambda position: self.game[position] == game)
+        if table_id is not None:
+            checks.append(lambda position: self.table[position] == table_id)
+        if date_from or date_to:
+            dates = self.dates.matching(lambda date: (not date_from or date >= date_from) and (not date_to or date <= date_to))
+            checks.append(lambda position: self.date[position] in dates)
+        if user:
+            code = self.users.codes.get(user, -1)
+            checks.append(lambda position: self.user[position] == code)
+        return lambda position: all(check(position) for check in checks)
+
+    def candidates(self, game_type=None, table_id=None, date_from=None, date_to=None, user=None):
+        """Sorted id arrays from the most selective index for the filters; None when nothing narrows the search.
+        An empty list means no session can match (e.g. no stored dates in the range)."""
+        options = []
+        if table_id is not None:
+            options.append([self.table_ids.get((game_type, table_id), ())])
+        elif game_type is not None:
+            options.append([self.game_ids.get(self.games.codes.get(game_type), ())])
+        if user:
+            options.append([self.user_ids.get(self.users.codes.get(user), ())])
+        if date_from or date_to:
+            low = bisect.bisect_left(self.date_keys, date_from) if date_from else 0
+            high = bisect.bisect_right(self.date_keys, date_to) if date_to else len(self.date_keys)
+            if high - low < len(self.date_keys):
+                options.append([self.date_ids[date] for date in self.date_keys[low:high]])
+        if not options:
+            return None
+        return min(options, key=lambda sources: sum(len(ids) for ids in sources))
+
+    def newest_first(self, sources, cursor=None):
+        """Ids below cursor from sorted id arrays, newest first, merged lazily"""
+        def descending(ids):
+            index = len(ids) if cursor is None else bisect.bisect_left(ids, cursor)
+            while index > 0:
+                index -= 1
+                yield ids[index]
+        if len(sources) == 1:
+            return descending(sources[0])
+        # Ids from different days rarely interleave, but the merge keeps the order right if they do
+        return heapq.merge(*map(descending, sources), reverse=True)
+
+    def positions(self, **filters):
+        """Rows matching the filters"""
+        sources = self.candidates(**filters)
+        if sources is None:
+            return range(len(self.ids))
+        matches = self.matcher(**filters)
+        return [position for position in map(self.row, self.newest_first(sources)) if matches(position)]
+
+    def page(self, game_type=None, table_id=None, cursor=None, limit=20, date_from=None, date_to=None, user=None):
+        """Newest-first page of sessions older than cursor; returns (sessions, next_cursor)"""
+        filters = {'game_type': game_type, 'table_id': table_id, 'date_from': date_from, 'date_to': date_to, 'user': user}
+        with self.lock:
+            matches = self.matcher(**filters)
+            sources = self.candidates(**filters)
+            ids = self.newest_first([self.ids] if sources is None else sources, cursor)
+            results = []
+            for session_id in ids:
+                position = self.row(session_id)
+                if matches(position):
+                    results.append(self.view(position))
+                    if len(results) == limit:
+                        break
+
+            # Only hand out a cursor if something older is left to look at
+            more = len(results) == limit and next(ids, None) is not None
+            return results, results[-1]['id'] if more else None
+
+    def iterate(self, batch=500, **filters):
+        """Every matching session, newest first, fetched a page at a time so the lock is only held briefly"""
+        cursor = None
+        while True:
+            sessions, cursor = self.page(cursor=cursor, limit=batch, **filters)
+            yield from sessions
+            if cursor is None:
+                return
+
+    def totals(self, **filters):
+        """Session count, amount and minutes over the matching sessions"""
+        with self.lock:
+            positions = self.positions(**filters)
+            if isinstance(positions, range):
+                return {"sessions": len(positions), "amount": sum(self.amount), "minutes": sum(self.duration)}
+            amount, duration = self.amount, self.duration
+            return {
+                "sessions": len(positions),
+                "amount": sum([amount[position] for position in positions]),
+                "minutes": sum([duration[position] for position in positions])
+            }
+
+    def query(self, min_duration=None, max_duration=None, min_amount=None, max_amount=None, limit=1000, **filters):
+        """Newest-first sessions matching the filters plus totals over every match; returns (sessions, totals)"""
+        with self.lock:
+            matches = self.matcher(**filters)
+            duration, amount = self.duration, self.amount
+            sessions, count, billed, minutes = [], 0, 0.0, 0.0
+            sources = self.candidates(**filters)
+            for position in map(self.row, self.newest_first([self.ids] if sources is None else sources)):
+                if not matches(position):
+                    continue
+                if ((min_duration is not None and duration[position] < min_duration)
+                        or (max_duration is not None and duration[position] > max_duration)
+                        or (min_amount is not None and amount[position] < min_amount)
+                        or (max_amount is not None and amount[position] > max_amount)):
+                    continue
+                count += 1
+                billed += amount[position]
+                minutes += duration[position]
+                if len(sessions) < limit:
+                    sessions.append(self.view(position))
+            return sessions, {"sessions": count, "amount": billed, "minutes": minutes}
+
+    def per_user(self, **filters):
+        """{user: [amount, sessions, minutes]} over the matching sessions"""
+        with self.lock:
+            users, amount, duration = self.user, self.amount, self.duration
+            sums = [[0.0, 0, 0.0] for _ in self.users.values]
+            for position in self.positions(**filters):
+                bucket = sums[users[position]]
+                bucket[0] += amount[position]
+                bucket[1] += 1
+                bucket[2] += duration[position]
+            return {self.users.values[code]: bucket for code, bucket in enumerate(sums) if bucket[1]}
+
+    def amount_of(self, game_type, table_id, session_ids):
+        """Total billed for some of a table's sessions; None if any id is not one of them"""
+        with self.lock:
+            ids = self.table_ids.get((game_type, table_id), [])
+            total = 0.0
+            for session_id in session_ids:
+                position = bisect.bisect_left(ids, session_id)
+                if position == len(ids) or ids[position] != session_id:
+                    return None
+                total += self.amount[self.row(session_id)]
+            return total
+
+    def __len__(self):
+        return len(self.ids)
+
+    def export(self):
+        """All sessions, oldest first, for ledger snapshots"""
+        with self.lock:
+            return [self.view(position) for position in range(len(self.ids))]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+HTTP Cache - compressed responses and cached page renders
+Features: gzip/brotli negotiation, Reused compressed bodies, Rendered page cache with strong ETags
+"""
+
+import collections
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE = {'text/html', 'application/json', 'text/css', 'application/javascript', 'text/plain'}
+
+class BoundedCache:
+    """Small thread-safe LRU dict"""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = collections.OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check that also accepts the per-encoding variants of a strong ETag"""
+    return any(if_none_match.contains(etag + suffix) for suffix in ('', '-gzip', '-br'))
+
+class Compressor:
+    """Negotiates and applies Content-Encoding; bodies tagged with a cache key are compressed once"""
+
+    def __init__(self, min_size=1024, cache_size=256):
+        self.min_size = min_size
+        self.cache = BoundedCache(cache_size)
+
+    def choose(self, accept_encoding):
+        if brotli is not None and accept_encoding['br']:
+            return 'br'
+        if accept_encoding['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=5)
+        return gzip.compress(data, compresslevel=6)
+
+    def apply(self, request, response, cache_key=None):
+        """Compress a buffered response in place when it is worth it and the client accepts it"""
+        if (response.is_streamed or response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = self.choose(request.accept_encodings)
+        if encoding is None or (response.content_length or 0) < self.min_size:
+            return response
+
+        body = self.cache.get((cache_key, encoding)) if cache_key else None
+        if body is None:
+            body = self.compress(response.get_data(), encoding)
+            if cache_key:
+                self.cache.put((cache_key, encoding), body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # A compressed body is a different representation, so its strong ETag must differ too
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+class PageCache:
+    """Rendered pages keyed by everything they depend on, with a strong ETag over the output"""
+
+    def __init__(self, size=512):
+        self.cache = BoundedCache(size)
+
+    def get(self, key, render):
+        """(body, etag) for a key, rendering only on the first request for it"""
+        page = self.cache.get(key)
+        if page is None:
+            body = render().encode('utf-8')
+            page = (body, hashlib.sha1(body).hexdigest())
+            self.cache.put(key, page)
+        return page
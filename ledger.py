@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Session Ledger - durable append-only log of table state transitions
+Features: Group-committed JSONL segment, Snapshot compaction, Crash recovery
+"""
+
+import json
+import os
+import threading
+import time
+
+class SessionLedger:
+    """Append-only JSONL log with batched fsync and snapshot compaction"""
+
+    shared = False
+
+    def __init__(self, data_dir, flush_interval=0.1, compact_every=1000):
+        os.makedirs(data_dir, exist_ok=True)
+        self.log_path = os.path.join(data_dir, 'ledger.jsonl')
+        self.snapshot_path = os.path.join(data_dir, 'snapshot.json')
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.snapshot_provider = None
+
+        self.seq = 0
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.records_since_snapshot = 0
+        self.running = True
+
+        self.log_file = None
+
+    def recover(self):
+        """Load the last snapshot and the log records written after it"""
+        state, snapshot_seq = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            state, snapshot_seq = snapshot['state'], snapshot['seq']
+
+        records = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb+') as f:
+                good_offset = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # torn write at the tail of the last batch
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # torn write at the tail of the last batch
+                    good_offset += len(line)
+                f.truncate(good_offset)
+
+        self.seq = max([snapshot_seq] + [record['seq'] for record in records])
+        self.records_since_snapshot = len(records)
+        return state, records
+
+    def start(self, snapshot_provider=None):
+        """Open the log for appending and start the group-commit thread"""
+        self.snapshot_provider = snapshot_provider
+        self.log_file = self.open_log()
+        flush_thread = threading.Thread(target=self.run_flusher, daemon=True)
+        flush_thread.start()
+
+    def append(self, record):
+        """Assign the next sequence number and queue the record for the next group commit"""
+        with self.pending_lock:
+            self.seq += 1
+            record = dict(record, seq=self.seq, ts=record.get('ts', time.time()))
+            self.pending.append(record)
+        self.wakeup.set()
+        return record
+
+    def run_flusher(self):
+        """Group commit: gather appends for one flush interval, then write and fsync once"""
+        while self.running:
+            self.wakeup.wait()
+            time.sleep(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+                if self.snapshot_provider and self.records_since_snapshot >= self.compact_every:
+                    self.compact()
+            except Exception as e:
+                print(f"Ledger error: {e}")
+                # Records left queued by a failed write are retried after a pause
+                self.wakeup.set()
+                time.sleep(1)
+
+    def open_log(self):
+        """Unbuffered append handle, so a failed write leaves nothing queued behind the file object"""
+        return open(self.log_path, 'ab', buffering=0)
+
+    def flush(self):
+        """Write and fsync all queued records; on failure they stay queued for the next flush"""
+        with self.pending_lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        data = memoryview(''.join(json.dumps(record) + '\n' for record in batch).encode('utf-8'))
+        with self.file_lock:
+            end = os.fstat(self.log_file.fileno()).st_size
+            try:
+                while data:
+                    data = data[self.log_file.write(data):]
+                os.fsync(self.log_file.fileno())
+            except Exception:
+                # The records are already applied in memory, so dropping them would lose them on restart.
+                # Cut off whatever part reached the file (a retry must not leave a torn line mid-log) and requeue.
+                try:
+                    os.ftruncate(self.log_file.fileno(), end)
+                except OSError:
+                    pass
+                with self.pending_lock:
+                    self.pending[:0] = batch
+                raise
+            self.records_since_snapshot += len(batch)
+
+    def compact(self):
+        """Write a snapshot and keep only the records it does not already reflect"""
+        with self.file_lock:
+            state, applied = self.snapshot_provider()
+            self.write_atomic(self.snapshot_path, json.dumps({"seq": self.seq, "state": state}))
+
+            with open(self.log_path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            tail = [
+                record for record in records
+                if record['seq'] > applied.get(f"{record['game_type']}:{record['table_id']}", 0)
+            ]
+            self.log_file.close()
+            self.write_atomic(self.log_path, ''.join(json.dumps(record) + '\n' for record in tail))
+            self.log_file = self.open_log()
+            self.records_since_snapshot = len(tail)
+
+    def write_atomic(self, path, content):
+        """Replace a file via a fsynced temporary so readers never see a partial write"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """Flush outstanding records and stop the group-commit thread"""
+        self.running = False
+        self.wakeup.set()
+        if self.log_file:
+            self.flush()
+            with self.file_lock:
+                self.log_file.close()
+                self.log_file = None
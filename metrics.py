@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Metrics - request and timer-loop instrumentation in Prometheus text format
+Features: Per-route counters and latency/size histograms, Timer tick health, Scrape-time gauges
+"""
+
+import bisect
+import threading
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576]
+
+class Histogram:
+    """Cumulative-bucket histogram; callers hold the Metrics lock"""
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.total}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+class Metrics:
+    """Process-wide metrics; recording is a dict lookup and a few additions under one lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.sizes = {}
+        self.tick_duration = Histogram(LATENCY_BUCKETS)
+        self.tick_drift = Histogram(LATENCY_BUCKETS)
+
+    def record_request(self, route, method, status, seconds, size):
+        with self.lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if size is not None:
+                histogram = self.sizes.get(route)
+                if histogram is None:
+                    histogram = self.sizes[route] = Histogram(SIZE_BUCKETS)
+                histogram.observe(size)
+
+    def record_tick(self, drift, duration=None):
+        """Wakeup lateness of a timer tick, and its run time when this worker did the work"""
+        with self.lock:
+            self.tick_drift.observe(max(drift, 0.0))
+            if duration is not None:
+                self.tick_duration.observe(duration)
+
+    def render(self, gauges):
+        """Prometheus text exposition; gauges is a list of (name, help, {label string: value})"""
+        lines = [
+            '# HELP table_tracker_requests_total HTTP requests by route, method and status.',
+            '# TYPE table_tracker_requests_total counter'
+        ]
+        with self.lock:
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'table_tracker_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+            for name, kind, histograms in [
+                ('table_tracker_request_duration_seconds', 'Request latency by route.', self.latency),
+                ('table_tracker_response_size_bytes', 'Response body size by route.', self.sizes)
+            ]:
+                lines += [f'# HELP {name} {kind}', f'# TYPE {name} histogram']
+                for route, histogram in sorted(histograms.items()):
+                    lines += histogram.render(name, f'route="{route}",')
+
+            for name, kind, histogram in [
+                ('table_tracker_timer_tick_duration_seconds', 'Time spent in one update_timers tick.', self.tick_duration),
+                ('table_tracker_timer_drift_seconds', 'How late update_timers woke versus the wall clock.', self.tick_drift)
+            ]:
+                lines += [f'# HELP {name} {kind}', f'# TYPE {name} histogram'] + histogram.render(name, '')
+
+        for name, kind, values in gauges:
+            lines += [f'# HELP {name} {kind}', f'# TYPE {name} gauge']
+            for labels, value in values.items():
+                lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
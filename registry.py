@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Table Registry - configurable game types and compact table objects
+Features: JSON config, O(1) lookup by (game_type, table_id), __slots__ tables, Copy-on-write updates, Tariffs
+"""
+
+import json
+import threading
+from tariffs import TariffSchedule
+
+class Table:
+    """Live state of one table; never mutated once published, updates go through replace()"""
+
+    __slots__ = (
+        'game_type', 'table_id', 'status', 'rate', 'start_time', 'elapsed_seconds', 'run_anchor',
+        'session_start_time', 'last_session', 'ledger_seq', 'segments', 'prepaid_seconds'
+    )
+
+    def __init__(self, game_type, table_id, rate):
+        self.game_type = game_type
+        self.table_id = table_id
+        self.status = 'idle'
+        self.rate = rate
+        self.start_time = None
+        self.elapsed_seconds = 0.0
+        self.run_anchor = None
+        self.session_start_time = None
+        self.last_session = None
+        self.ledger_seq = 0
+        self.segments = ()
+        self.prepaid_seconds = None
+
+    def replace(self, **changes):
+        """Copy of this table with some fields changed"""
+        table = Table.__new__(Table)
+        for field in Table.__slots__:
+            setattr(table, field, changes[field] if field in changes else getattr(self, field))
+        return table
+
+class TableRegistry:
+    """Every game type and table, loaded from config"""
+
+    def __init__(self, config):
+        self.available_rates = [float(rate) for rate in config['available_rates']]
+        self.tariffs = TariffSchedule(config.get('tariffs', []))
+        self.labels = {}
+        self.game_tables = {}
+        self.locks = {}
+
+        for game_type, spec in config['game_types'].items():
+            self.labels[game_type] = spec.get('label', game_type.replace('_', ' ').title())
+            rates = spec.get('tables') or [spec['rate']] * spec['count']
+            self.game_tables[game_type] = {
+                table_id: Table(game_type, table_id, float(rate)) for table_id, rate in enumerate(rates, start=1)
+            }
+            for table_id in self.game_tables[game_type]:
+                self.locks[game_type, table_id] = threading.RLock()
+
+    @classmethod
+    def load(cls, path):
+        """Build the registry from a JSON config file"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def __contains__(self, game_type):
+        return game_type in self.game_tables
+
+    @property
+    def game_types(self):
+        return list(self.game_tables)
+
+    def tables(self, game_type):
+        """Tables of one game type by id, or None for an unknown game type"""
+        return self.game_tables.get(game_type)
+
+    def get(self, game_type, table_id):
+        tables = self.game_tables.get(game_type)
+        return tables.get(table_id) if tables is not None else None
+
+    def lock(self, game_type, table_id):
+        return self.locks[game_type, table_id]
+
+    def publish(self, table):
+        """Swap in a new version of a table; readers holding the old one are unaffected"""
+        self.game_tables[table.game_type][table.table_id] = table
+
+    def table_count(self):
+        return sum(len(tables) for tables in self.game_tables.values())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Reservations - phone bookings per table with an interval index
+Features: Create/modify/cancel, Conflict checks and free-slot queries in O(log n + k), Upcoming-booking lookups
+
+A table never holds two overlapping bookings, so its bookings sorted by start are also sorted
+by end. Two parallel sorted lists are then an interval index: the first booking that can overlap
+[start, end) is found by bisecting the ends, and the scan stops at the first booking starting at
+or after `end`. Times are epoch seconds.
+"""
+
+import bisect
+import threading
+from datetime import datetime
+
+FIELDS = ['name', 'phone', 'note']
+
+def parse_time(value):
+    """Epoch seconds from a number or a local ISO 8601 string such as '2024-05-01T18:30'"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    raise ValueError(f"Invalid time: {value!r}")
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+def public(reservation):
+    """API view of a booking, with local ISO times"""
+    return dict(reservation, start=format_time(reservation['start']), end=format_time(reservation['end']))
+
+class TableBookings:
+    """Non-overlapping bookings of one table, sorted by start"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+
+    def overlapping(self, start, end):
+        """Ids of bookings overlapping [start, end), earliest first"""
+        index = bisect.bisect_right(self.ends, start)
+        while index < len(self.starts) and self.starts[index] < end:
+            yield self.ids[index]
+            index += 1
+
+    def insert(self, reservation_id, start, end):
+        index = bisect.bisect_left(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.ids.insert(index, reservation_id)
+
+    def remove(self, reservation_id, start):
+        index = bisect.bisect_left(self.starts, start)
+        while self.ids[index] != reservation_id:
+            index += 1
+        del self.starts[index], self.ends[index], self.ids[index]
+
+class ReservationBook:
+    """Every table's bookings, addressed by id (the seq of the ledger event that created them)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.reservations = {}
+
+    def get(self, reservation_id):
+        with self.lock:
+            return self.reservations.get(reservation_id)
+
+    def conflicts(self, game_type, table_id, start, end, ignore=None):
+        """Bookings of a table overlapping [start, end), other than `ignore`"""
+        with self.lock:
+            bookings = self.tables.get((game_type, table_id))
+            if bookings is None:
+                return []
+            return [
+                self.reservations[reservation_id] for reservation_id in bookings.overlapping(start, end)
+                if reservation_id != ignore
+            ]
+
+    def add(self, reservation_id, reservation):
+        """Book a table; returns None for a replayed id or a slot that is already taken"""
+        with self.lock:
+            key = (reservation['game_type'], reservation['table_id'])
+            bookings = self.tables.setdefault(key, TableBookings())
+            if reservation_id in self.reservations or next(bookings.overlapping(reservation['start'], reservation['end']), None):
+                return None
+            record = self.reservations[reservation_id] = dict(reservation, id=reservation_id)
+            bookings.insert(reservation_id, record['start'], record['end'])
+            return record
+
+    def update(self, reservation_id, changes):
+        """Change a booking's time or details; returns None if it is gone or the new time is taken"""
+        with self.lock:
+            current = self.reservations.get(reservation_id)
+            if current is None:
+                return None
+            updated = dict(current, **changes)
+            bookings = self.tables[(current['game_type'], current['table_id'])]
+            if any(other != reservation_id for other in bookings.overlapping(updated['start'], updated['end'])):
+                return None
+            bookings.remove(reservation_id, current['start'])
+            bookings.insert(reservation_id, updated['start'], updated['end'])
+            self.reservations[reservation_id] = updated
+            return updated
+
+    def cancel(self, reservation_id):
+        """Drop a booking and return it, or None if there was none"""
+        with self.lock:
+            current = self.reservations.pop(reservation_id, None)
+            if current is not None:
+                self.tables[(current['game_type'], current['table_id'])].remove(reservation_id, current['start'])
+            return current
+
+    def between(self, game_type, table_id, start, end):
+        """Bookings of a table overlapping a window, earliest first"""
+        return self.conflicts(game_type, table_id, start, end)
+
+    def free_slots(self, game_type, table_id, start, end, min_seconds=0):
+        """(start, end) gaps of at least min_seconds between the table's bookings inside a window"""
+        slots, cursor = [], start
+        for booking in self.between(game_type, table_id, start, end) + [{'start': end, 'end': end}]:
+            gap = booking['start'] - cursor
+            if gap > 0 and gap >= min_seconds:
+                slots.append((cursor, booking['start']))
+            cursor = max(cursor, booking['end'])
+        return slots
+
+    def upcoming(self, game_type, table_id, now, horizon):
+        """The booking in progress or starting within horizon seconds, or None"""
+        bookings = self.between(game_type, table_id, now, now + horizon)
+        return bookings[0] if bookings else None
+
+    def export(self):
+        """All bookings, for ledger snapshots"""
+        with self.lock:
+            return sorted(self.reservations.values(), key=lambda reservation: reservation['id'])
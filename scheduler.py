@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Scheduler - hierarchical timer wheel for per-table alerts and auto-actions
+Features: O(1) arm and cancel, Cost proportional to due timers, Background runner that sleeps while nothing is armed
+
+The wheel has `levels` rings of `slots` buckets. Level 0 buckets are one tick wide; a bucket
+on level n covers slots**n ticks. A timer is armed on the lowest level whose span reaches its
+deadline, and is moved down a level ("cascaded") when the clock reaches its bucket, so each
+timer is touched at most once per level.
+"""
+
+import math
+import threading
+import time
+
+class Timer:
+    """Handle returned by arm(); pass it to cancel()"""
+
+    __slots__ = ('due', 'callback', 'args', 'bucket')
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.bucket = None
+
+class TimerWheel:
+    """Timers at `resolution`-second granularity (default one second)"""
+
+    def __init__(self, resolution=1.0, slots=64, levels=4, clock=time.time):
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.tick = int(clock() / resolution)
+        self.count = 0
+
+    def arm(self, at, callback, *args):
+        """Run callback(*args) once the clock reaches `at` (epoch seconds)"""
+        with self.lock:
+            if not self.count:
+                # Nothing is armed, so the clock can jump instead of stepping through idle ticks
+                self.tick = max(self.tick, int(self.clock() / self.resolution))
+            timer = Timer(max(math.ceil(at / self.resolution), self.tick + 1), callback, args)
+            self.place(timer)
+            self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        """Disarm a timer; a no-op if it already fired or was cancelled"""
+        with self.lock:
+            if timer.bucket is not None and timer.bucket.pop(timer, None) is not None:
+                timer.bucket = None
+                self.count -= 1
+
+    def place(self, timer):
+        delta = max(timer.due - self.tick, 0)
+        level = 0
+        while level < self.levels - 1 and delta >= self.slots ** (level + 1):
+            level += 1
+        bucket = self.wheels[level][(timer.due // self.slots ** level) % self.slots]
+        bucket[timer] = timer
+        timer.bucket = bucket
+
+    def advance(self, now=None):
+        """Move the clock to now and return the timers that fell due, earliest tick first"""
+        target = int((self.clock() if now is None else now) / self.resolution)
+        due = []
+        with self.lock:
+            if not self.count:
+                self.tick = max(self.tick, target)
+                return due
+            while self.tick < target:
+                self.tick += 1
+                # Higher levels first, so timers cascading through several levels land before level 0 fires
+                for level in range(self.levels - 1, 0, -1):
+                    span = self.slots ** level
+                    if self.tick % span == 0:
+                        bucket = self.wheels[level][(self.tick // span) % self.slots]
+                        timers = list(bucket)
+                        bucket.clear()
+                        for timer in timers:
+                            self.place(timer)
+                bucket = self.wheels[0][self.tick % self.slots]
+                # Level 0 holds only timers due within one turn; the check keeps a late arm() from firing early
+                for timer in list(bucket):
+                    if timer.due <= self.tick:
+                        del bucket[timer]
+                        timer.bucket = None
+                        due.append(timer)
+                        self.count -= 1
+        return due
+
+class Scheduler:
+    """A TimerWheel driven by a daemon thread; callbacks run on that thread"""
+
+    def __init__(self, wheel=None):
+        self.wheel = wheel or TimerWheel()
+        self.wakeup = threading.Event()
+        self.running = False
+
+    def arm(self, at, callback, *args):
+        timer = self.wheel.arm(at, callback, *args)
+        self.wakeup.set()
+        return timer
+
+    def cancel(self, timer):
+        self.wheel.cancel(timer)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def run(self):
+        while self.running:
+            if self.wheel.count:
+                # Wake on the next tick boundary; an empty tick costs one bucket lookup
+                now = time.time()
+                self.wakeup.wait(self.wheel.resolution - now % self.wheel.resolution)
+            else:
+                self.wakeup.wait()
+            self.wakeup.clear()
+            for timer in self.wheel.advance():
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    print(f"Scheduler error: {e}")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Snapshot Cache - pre-encoded table state shared by concurrent pollers
+Features: One cached body per game type, Single-flight encoding, Optional orjson encoder
+"""
+
+import threading
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the app's JSON provider is used without it
+    orjson = None
+
+class Flight:
+    """One in-progress encoding that other readers of the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+
+class SnapshotCache:
+    """Encoded response bodies keyed per game type; a new key (version, second) replaces the old body"""
+
+    def __init__(self, fallback_dumps):
+        self.fallback_dumps = fallback_dumps
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.flights = {}
+
+    def encode(self, payload):
+        if orjson is not None:
+            # Same output shape as Flask's provider: sorted keys, int keys as strings, HTTP dates
+            return orjson.dumps(
+                payload, default=http_date,
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        return self.fallback_dumps(payload).encode('utf-8')
+
+    def get(self, game_type, key, build):
+        """Cached body for (game_type, key); only one caller builds and encodes it, the rest wait"""
+        with self.lock:
+            entry = self.entries.get(game_type)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+            flight = self.flights.get((game_type, key))
+            leader = flight is None
+            if leader:
+                flight = self.flights[game_type, key] = Flight()
+
+        if not leader:
+            flight.done.wait()
+            return flight.body if flight.body is not None else self.encode(build())
+
+        try:
+            flight.body = self.encode(build())
+            with self.lock:
+                entry = self.entries.get(game_type)
+                if entry is None or entry[0] <= key:
+                    self.entries[game_type] = (key, flight.body)
+            return flight.body
+        finally:
+            with self.lock:
+                self.flights.pop((game_type, key), None)
+            flight.done.set()
+
+    def invalidate(self, game_type):
+        """Drop the cached body of a game type after its tables change"""
+        with self.lock:
+            self.entries.pop(game_type, None)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Startup Profile - where a cold start spends its time
+Features: Import timings, Per-phase TableTracker timings, Time to first request and to full readiness
+
+Usage:
+    python startup.py            # human-readable report
+    python startup.py --json     # machine-readable report
+"""
+
+import importlib
+import json
+import sys
+import time
+
+DEPENDENCIES = ['flask', 'flask_cors', 'flask_login', 'werkzeug.security']
+
+def profile():
+    process_started = time.perf_counter()
+    report = {"imports": {}, "tracker": {}, "requests": {}}
+
+    for module in DEPENDENCIES:
+        started = time.perf_counter()
+        importlib.import_module(module)
+        report["imports"][module] = time.perf_counter() - started
+
+    # Importing app builds the tracker; the phases it records include the background ones once ready
+    started = time.perf_counter()
+    import app as app_module
+    report["imports"]["app"] = time.perf_counter() - started
+    tracker = app_module.app_instance
+    if tracker is None:
+        raise SystemExit("startup.py profiles a single tracker; unset VENUES_CONFIG")
+
+    client = app_module.app.test_client()
+    started = time.perf_counter()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    report["requests"]["first_login"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client.get(f'/api/{tracker.registry.game_types[0]}/tables')
+    report["requests"]["first_tables"] = time.perf_counter() - started
+
+    tracker.ready.wait()
+    report["tracker"] = dict(tracker.startup_timings)
+    report["total"] = time.perf_counter() - process_started
+    return report
+
+def main():
+    report = profile()
+    if '--json' in sys.argv:
+        print(json.dumps({
+            section: {key: round(value * 1000, 2) for key, value in values.items()} if isinstance(values, dict)
+            else round(values * 1000, 2)
+            for section, values in report.items()
+        }, indent=2))
+        return
+
+    for section in ['imports', 'tracker', 'requests']:
+        print(f"{section}:")
+        for phase, seconds in report[section].items():
+            print(f"  {phase:<18}{seconds * 1000:9.1f} ms")
+    print(f"total{'':<15}{report['total'] * 1000:9.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+State Store - pluggable backends for table events and user records
+Features: File-backed store, Shared SQLite store for multiple workers, Host-wide scheduler lock
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX hosts run a single process anyway
+    fcntl = None
+
+from ledger import SessionLedger
+
+class FileUserStore:
+    """Users kept in memory and persisted to a JSON file so hashes are never recomputed at boot"""
+
+    def __init__(self, path, user_factory):
+        self.path = path
+        self.user_factory = user_factory
+        self.lock = threading.Lock()
+        self.users = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for username, (password_hash, role) in json.load(f).items():
+                    self.users[username] = user_factory(username, username, password_hash, role)
+
+    def get(self, username):
+        return self.users.get(username)
+
+    def __contains__(self, username):
+        return username in self.users
+
+    def values(self):
+        return list(self.users.values())
+
+    def add(self, username, password_hash, role):
+        with self.lock:
+            self.users[username] = self.user_factory(username, username, password_hash, role)
+            self.save()
+
+    def remove(self, username):
+        with self.lock:
+            if self.users.pop(username, None):
+                self.save()
+
+    def save(self):
+        """Rewrite the users file through a temporary so a crash never leaves it half written"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({user.username: [user.password_hash, user.role] for user in self.users.values()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def seed(self, defaults):
+        """Add default users (given with precomputed hashes) that do not exist yet"""
+        for username, (password_hash, role) in defaults.items():
+            if username not in self:
+                self.add(username, password_hash, role)
+
+class SQLiteStore:
+    """Shared SQLite database (WAL mode) holding the event feed, snapshots and users"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, game_type TEXT, table_id INTEGER, ts REAL, body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY CHECK (id = 1), seq INTEGER, state TEXT);
+            CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password_hash TEXT NOT NULL, role TEXT NOT NULL);
+        ''')
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+class SQLiteLedger:
+    """Event log shared by every worker on the host; doubles as the cross-process change feed"""
+
+    shared = True
+
+    def __init__(self, store, compact_every=1000, retention=60):
+        self.store = store
+        self.compact_every = compact_every
+        self.retention = retention
+        self.snapshot_provider = None
+        # Feed position the last snapshot reflects
+        self.snapshot_seq = 0
+
+    def recover(self):
+        """Load the snapshot and every event still in the feed"""
+        rows = self.store.execute("SELECT seq, state FROM snapshots WHERE id = 1")
+        state = json.loads(rows[0][1]) if rows else None
+        self.snapshot_seq = rows[0][0] if rows else 0
+        return state, self.read_since(0)
+
+    def start(self, snapshot_provider=None):
+        """Only the scheduler owner passes a snapshot provider and compacts"""
+        self.snapshot_provider = snapshot_provider
+
+    def append(self, record):
+        """Insert the record; the database assigns a host-wide sequence number"""
+        record = dict(record, ts=record.get('ts', time.time()), origin=os.getpid())
+        with self.store.lock:
+            cursor = self.store.conn.execute(
+                "INSERT INTO events (game_type, table_id, ts, body) VALUES (?, ?, ?, ?)",
+                (record['game_type'], record['table_id'], record['ts'], json.dumps(record))
+            )
+            record['seq'] = cursor.lastrowid
+        return record
+
+    def read_since(self, seq):
+        """Events committed after seq, in order"""
+        rows = self.store.execute("SELECT seq, body FROM events WHERE seq > ? ORDER BY seq", (seq,))
+        return [dict(json.loads(body), seq=row_seq) for row_seq, body in rows]
+
+    def maybe_compact(self, synced_seq):
+        """Snapshot and trim the feed once enough events (from any worker) have accumulated since the last snapshot"""
+        if self.snapshot_provider and synced_seq - self.snapshot_seq >= self.compact_every:
+            self.compact(synced_seq)
+
+    def compact(self, synced_seq=0):
+        """Write a snapshot and delete the events it already reflects"""
+        state, applied = self.snapshot_provider()
+        # The state is exported after synced_seq was read, so it reflects every event up to it
+        synced = max([synced_seq] + list(applied.values()))
+        # Keep recent events so slower workers can still follow the feed past them
+        cutoff = time.time() - self.retention
+        with self.store.lock:
+            self.store.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.store.conn.execute(
+                    "INSERT OR REPLACE INTO snapshots (id, seq, state) VALUES (1, ?, ?)", (synced, json.dumps(state))
+                )
+                for key, seq in applied.items():
+                    game_type, table_id = key.split(':')
+                    if table_id == 'None':
+                        continue  # game-wide events are trimmed below
+                    self.store.conn.execute(
+                        "DELETE FROM events WHERE game_type = ? AND table_id = ? AND seq <= ? AND ts < ?",
+                        (game_type, int(table_id), seq, cutoff)
+                    )
+                self.store.conn.execute(
+                    "DELETE FROM events WHERE table_id IS NULL AND seq <= ? AND ts < ?", (synced, cutoff)
+                )
+                self.store.conn.execute("COMMIT")
+            except Exception:
+                self.store.conn.execute("ROLLBACK")
+                raise
+        self.snapshot_seq = synced
+
+    def close(self):
+        pass
+
+class SQLiteUserStore:
+    """Users kept in the shared SQLite database so every worker sees the same accounts"""
+
+    def __init__(self, store, user_factory):
+        self.store = store
+        self.user_factory = user_factory
+
+    def get(self, username):
+        rows = self.store.execute("SELECT username, password_hash, role FROM users WHERE username = ?", (username,))
+        return self.user_factory(rows[0][0], *rows[0]) if rows else None
+
+    def __contains__(self, username):
+        return bool(self.store.execute("SELECT 1 FROM users WHERE username = ?", (username,)))
+
+    def values(self):
+        rows = self.store.execute("SELECT username, password_hash, role FROM users ORDER BY username")
+        return [self.user_factory(row[0], *row) for row in rows]
+
+    def add(self, username, password_hash, role):
+        self.store.execute(
+            "INSERT OR REPLACE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+            (username, password_hash, role)
+        )
+
+    def remove(self, username):
+        self.store.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    def seed(self, defaults):
+        """Add default users (given with precomputed hashes) that do not exist yet"""
+        for username, (password_hash, role) in defaults.items():
+            self.store.execute(
+                "INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                (username, password_hash, role)
+            )
+
+class HostLock:
+    """Non-blocking host-wide lock so exactly one worker runs the scheduler"""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def acquire(self):
+        """Try to become (or stay) the owner; returns whether this process owns the lock"""
+        if self.handle is not None:
+            return True
+        if fcntl is None:
+            self.handle = True
+            return True
+
+        handle = open(self.path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
+
+def open_state_backend(data_dir, backend, user_factory):
+    """Build the (ledger, user store) pair for the configured backend: 'file' or 'sqlite'"""
+    os.makedirs(data_dir, exist_ok=True)
+    if backend == 'sqlite':
+        store = SQLiteStore(os.path.join(data_dir, 'state.db'))
+        return SQLiteLedger(store), SQLiteUserStore(store, user_factory)
+    if backend == 'file':
+        return SessionLedger(data_dir), FileUserStore(os.path.join(data_dir, 'users.json'), user_factory)
+    raise ValueError(f"Unknown state backend: {backend}")
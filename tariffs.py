@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tariffs - time-of-day and weekday pricing over session segments
+Features: Peak/off-peak/weekend multipliers, Segment billing in O(segments), Batch re-pricing for audits
+
+A session is billed from its segments: (start, end, base_rate) runs in epoch seconds, with
+end None while the run is live. Each run is split only where a tariff window starts or ends.
+"""
+
+from datetime import datetime
+
+DAY_SECONDS = 24 * 60 * 60
+
+def clock_seconds(value):
+    """'HH:MM' -> seconds after midnight"""
+    hours, minutes = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60
+
+class TariffSchedule:
+    """Ordered tariff rules; the first rule matching a moment sets the multiplier on the table's base rate"""
+
+    def __init__(self, rules):
+        self.rules = []
+        edges = set()
+        for rule in rules:
+            start, end = clock_seconds(rule.get('from', '00:00')), clock_seconds(rule.get('to', '24:00'))
+            self.rules.append((
+                rule['name'], set(rule.get('days', range(7))), start, end, float(rule['multiplier'])
+            ))
+            edges.update([start % DAY_SECONDS, end % DAY_SECONDS])
+        # Midnight is always an edge because rules are keyed by weekday
+        self.edges = sorted(edges | {0}) if self.rules else []
+
+    def window_at(self, timestamp):
+        """(name, multiplier, until) of the tariff in force at a moment; it holds until `until`"""
+        if not self.rules:
+            return 'standard', 1.0, float('inf')
+
+        moment = datetime.fromtimestamp(timestamp)
+        into_day = moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+        until = timestamp + next((edge for edge in self.edges if edge > into_day), DAY_SECONDS) - into_day
+
+        weekday = moment.weekday()
+        for name, days, start, end, multiplier in self.rules:
+            if start <= end:
+                matches = weekday in days and start <= into_day < end
+            else:  # window wraps past midnight, e.g. Fri 22:00-02:00 also covers Saturday until 02:00
+                matches = (weekday in days and into_day >= start) or ((weekday - 1) % 7 in days and into_day < end)
+            if matches:
+                return name, multiplier, until
+        return 'standard', 1.0, until
+
+    def pieces(self, segments, now):
+        """(start, end, base_rate, tariff name, multiplier) slices of the segments, cut at tariff edges"""
+        for start, end, rate in segments:
+            end = now if end is None else end
+            while start < end:
+                name, multiplier, until = self.window_at(start)
+                stop = min(end, until)
+                yield start, stop, rate, name, multiplier
+                start = stop
+
+    def price(self, segments, now):
+        """Amount owed for the segments, billing a live run up to now"""
+        return sum(
+            ((stop - start) / 60 * rate * multiplier for start, stop, rate, _, multiplier in self.pieces(segments, now)), 0.0
+        )
+
+    def rate_at(self, base_rate, timestamp):
+        """Effective per-minute rate at a moment"""
+        return base_rate * self.window_at(timestamp)[1]
+
+    def breakdown(self, segments, now):
+        """Bill lines per tariff for receipts and audits"""
+        lines = {}
+        for start, stop, rate, name, multiplier in self.pieces(segments, now):
+            line = lines.setdefault((name, rate * multiplier), [0.0, 0.0])
+            line[0] += (stop - start) / 60
+            line[1] += (stop - start) / 60 * rate * multiplier
+        return [
+            {"tariff": name, "rate": round(rate, 2), "minutes": round(minutes, 1), "amount": round(amount, 2)}
+            for (name, rate), (minutes, amount) in lines.items()
+        ]
+
+def reprice(sessions, schedule):
+    """Re-bill completed sessions under a schedule; yields (session, new amount), None where no segments were kept"""
+    for session in sessions:
+        segments = session.get('segments')
+        if not segments:
+            yield session, None
+            continue
+        yield session, round(schedule.price(segments, segments[-1][1]), 2)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Venues - one isolated tracker shard per parlour
+Features: Venue config, Deterministic venue-to-process mapping, Path-prefix dispatch
+
+A venues config looks like tables.json with one table layout per venue:
+    {"available_rates": [...], "venues": {"downtown": {"label": "Downtown", "game_types": {...}}, ...}}
+A venue may pin itself to a process with "process": <index>; otherwise it is placed by a stable hash.
+
+Usage:
+    python venues.py venues.json 4    # print which of 4 processes serves each venue
+"""
+
+import json
+import os
+import re
+import sys
+import zlib
+from werkzeug.wrappers import Request, Response
+from werkzeug.utils import redirect
+
+VENUE_PATH = re.compile(r'^/v/([A-Za-z0-9_-]+)(/.*)?$')
+
+def load_venues(path):
+    """Per-venue registry configs, with top-level settings (e.g. available_rates) as defaults"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    defaults = {key: value for key, value in config.items() if key != 'venues'}
+    return {venue: dict(defaults, **spec) for venue, spec in config['venues'].items()}
+
+def venue_process(venue, spec, processes):
+    """Index of the process that owns a venue; the same on every host and restart"""
+    if 'process' in spec:
+        return int(spec['process']) % processes
+    return zlib.crc32(venue.encode('utf-8')) % processes
+
+class VenueDispatcher:
+    """WSGI app routing /v/<venue>/... to that venue's own tracker; other processes own the other venues"""
+
+    def __init__(self, tracker_factory, venues, processes=1, process=0):
+        self.processes = processes
+        self.owner = {venue: venue_process(venue, spec, processes) for venue, spec in venues.items()}
+        self.labels = {venue: spec.get('label', venue.replace('_', ' ').title()) for venue, spec in venues.items()}
+        self.trackers = {}
+        for venue, spec in venues.items():
+            if self.owner[venue] != process:
+                continue
+            tracker = tracker_factory(venue=venue, config=spec)
+            tracker.app.config['SESSION_COOKIE_PATH'] = f'/v/{venue}'
+            self.trackers[venue] = tracker
+
+    @classmethod
+    def from_env(cls, tracker_factory):
+        """Build from VENUES_CONFIG, VENUE_PROCESSES (default 1) and VENUE_PROCESS (this process, default 0)"""
+        return cls(
+            tracker_factory, load_venues(os.environ['VENUES_CONFIG']),
+            processes=int(os.environ.get('VENUE_PROCESSES', 1)), process=int(os.environ.get('VENUE_PROCESS', 0))
+        )
+
+    def __call__(self, environ, start_response):
+        match = VENUE_PATH.match(environ.get('PATH_INFO', ''))
+        if not match:
+            return self.index(environ, start_response)
+
+        venue = match.group(1)
+        tracker = self.trackers.get(venue)
+        if tracker is None:
+            if venue not in self.owner:
+                response = self.json({"error": "Unknown venue"}, 404)
+            else:
+                # Lets a proxy (or a confused client) see where the venue actually lives
+                response = self.json({"error": "Venue served by another process", "process": self.owner[venue]}, 421)
+            return response(environ, start_response)
+
+        environ = dict(environ, SCRIPT_NAME=environ.get('SCRIPT_NAME', '') + f'/v/{venue}',
+                       PATH_INFO=match.group(2) or '/')
+        return tracker.app(environ, start_response)
+
+    def index(self, environ, start_response):
+        """Redirect to the only venue here, or list the venues this process serves"""
+        request = Request(environ)
+        if len(self.trackers) == 1 and request.path == '/':
+            response = redirect(f"{request.script_root}/v/{next(iter(self.trackers))}/")
+        elif request.path == '/':
+            response = self.json({"success": True, "venues": [
+                {"venue": venue, "label": self.labels[venue], "url": f"{request.script_root}/v/{venue}/"}
+                for venue in self.trackers
+            ]})
+        else:
+            response = self.json({"error": "Not found"}, 404)
+        return response(environ, start_response)
+
+    def json(self, payload, status=200):
+        return Response(json.dumps(payload), status=status, mimetype='application/json')
+
+if __name__ == '__main__':
+    venues = load_venues(sys.argv[1])
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.environ.get('VENUE_PROCESSES', 1))
+    for venue, spec in sorted(venues.items()):
+        print(f"{venue}\t{venue_process(venue, spec, processes)}")
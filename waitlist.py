@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Waitlist - walk-in parties queued per game type
+Features: Heap per rate tier with lazy removal, O(log n) next-party proposal, Wait estimates from running tables
+
+Parties wait in join order. A party may ask for one rate tier or take any table; the next
+party for a freed table is the earlier of the heads of that table's tier heap and the
+any-tier heap. Removed parties are dropped from a heap only when they reach its head.
+"""
+
+import heapq
+import threading
+
+class Waitlist:
+    """Queued parties addressed by id (the seq of the ledger event that added them)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.heaps = {}
+        # Last ledger seq applied, so replays after a snapshot are skipped
+        self.applied_seq = 0
+
+    def add(self, entry_id, entry):
+        """Queue a party; returns None for a replay of an id already queued"""
+        with self.lock:
+            if entry_id in self.entries:
+                return None
+            record = self.entries[entry_id] = dict(entry, id=entry_id)
+            heapq.heappush(self.heaps.setdefault((record['game_type'], record['rate']), []), (record['joined'], entry_id))
+            return record
+
+    def remove(self, entry_id):
+        """Take a party off the list and return it, or None if it was not waiting"""
+        with self.lock:
+            return self.entries.pop(entry_id, None)
+
+    def get(self, entry_id):
+        with self.lock:
+            return self.entries.get(entry_id)
+
+    def head(self, game_type, rate):
+        """(joined, id) of the first live party in a heap, discarding removed ones on the way"""
+        heap = self.heaps.get((game_type, rate))
+        while heap and heap[0][1] not in self.entries:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def next_for(self, game_type, rate):
+        """The party that should get a freed table at this rate, or None"""
+        with self.lock:
+            heads = [head for head in (self.head(game_type, rate), self.head(game_type, None)) if head]
+            return self.entries[min(heads)[1]] if heads else None
+
+    def waiting(self, game_type):
+        """Parties of a game type in queue order"""
+        with self.lock:
+            return sorted(
+                (entry for entry in self.entries.values() if entry['game_type'] == game_type),
+                key=lambda entry: (entry['joined'], entry['id'])
+            )
+
+    def estimate(self, game_type, free_at, session_seconds):
+        """Seconds until each party is likely seated, by replaying the queue against table free times.
+
+        free_at maps table id to (rate, seconds until free); each seating keeps that table busy
+        for one typical session.
+        """
+        free_at = dict(free_at)
+        waits = {}
+        for entry in self.waiting(game_type):
+            eligible = [table_id for table_id, (rate, _) in free_at.items() if entry['rate'] in (None, rate)]
+            if not eligible:
+                waits[entry['id']] = None
+                continue
+            table_id = min(eligible, key=lambda table_id: free_at[table_id][1])
+            rate, seconds = free_at[table_id]
+            waits[entry['id']] = seconds
+            free_at[table_id] = (rate, seconds + session_seconds)
+        return waits
+
+    def load(self, saved):
+        """Restore from a ledger snapshot"""
+        for entry in saved.get('entries', []):
+            self.add(entry['id'], entry)
+        self.applied_seq = max(self.applied_seq, saved.get('seq', 0))
+
+    def export(self):
+        """Queued parties plus the last seq applied, for ledger snapshots"""
+        with self.lock:
+            return {"seq": self.applied_seq, "entries": sorted(self.entries.values(), key=lambda entry: entry['id'])}